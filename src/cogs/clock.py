@@ -1,17 +1,25 @@
+import asyncio
+import math
+import time
 from datetime import datetime, timedelta, timezone
+from io import BytesIO
 
 import disnake
+import numpy as np
 from disnake.ext import commands, tasks
 from PIL import Image
 
 from main import tracked_templates
-from utils.discord_utils import get_image_url, image_to_file
+from utils.discord_utils import get_image_url, image_to_bytes
 from utils.log import get_logger
 from utils.setup import db_servers, db_stats, db_templates, db_users, stats, ws_client
 from utils.time_converter import local_to_utc
 
 logger = get_logger("clock")
 
+MAX_SENDS = 10  # number of simultaneous messages sent
+MIN_BOARD_UPDATE_INTERVAL = 5 * 60  # seconds between board updates without new stats
+
 
 class Clock(commands.Cog):
     """A class used to manage background periodic tasks.
@@ -20,6 +28,8 @@ class Clock(commands.Cog):
 
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        # monotonic time of the last successful board update
+        self.last_board_update = -math.inf
         self.update_stats.start()
         self.update_online_count.start()
 
@@ -27,15 +37,12 @@ class Clock(commands.Cog):
         self.update_stats.cancel()
         self.update_online_count.cancel()
 
-    @tasks.loop(seconds=60)
+    @tasks.loop(minutes=15)
     async def update_stats(self):
-        now = datetime.now()
-        min = now.strftime("%M")
-        if min in ["01", "16", "31", "46"]:
-            try:
-                await self._update_stats_data()
-            except Exception:
-                logger.exception("Unexpected exception in task 'update_stats'")
+        try:
+            await self._update_stats_data()
+        except Exception:
+            logger.exception("Unexpected exception in task 'update_stats'")
 
     @update_stats.error
     async def update_stats_error(self, error):
@@ -76,22 +83,28 @@ class Clock(commands.Cog):
         except Exception:
             logger.exception("Unexpected error in 'update_combo'")
 
-        # wait for the time to be a round value
-        round_minute = datetime.now(timezone.utc) + timedelta(minutes=1)
-        round_minute = round_minute.replace(second=0, microsecond=0)
-        await disnake.utils.sleep_until(round_minute)
+        # wait for the next update time (every 15 minutes at xx:01, xx:16, ...)
+        next_run = datetime.now(timezone.utc) + timedelta(minutes=1)
+        next_run = next_run.replace(second=0, microsecond=0)
+        while next_run.minute % 15 != 1:
+            next_run += timedelta(minutes=1)
+        await disnake.utils.sleep_until(next_run)
 
     async def _update_stats_data(self):
         # refreshing stats json
-        if await stats.refresh():
+        refreshed = await stats.refresh()
+        # get the canvas code once for the whole update
+        canvas_code = await stats.get_canvas_code()
+        if refreshed:
             logger.debug("Stats refreshed.")
 
             # create a record for the current time and canvas
-            record_id = await self.create_record()
+            record_id = await self.create_record(canvas_code)
             if record_id is None:
                 # there is already a record saved for the current time
                 try:
                     await self.update_boards()
+                    self.last_board_update = time.monotonic()
                     logger.debug("Board updated.")
                 except ValueError as e:
                     logger.error(f"Couldn't update boards: {e}")
@@ -105,7 +118,6 @@ class Clock(commands.Cog):
 
             # check on update for the palette
             palette = stats.get_palette()
-            canvas_code = await stats.get_canvas_code()
             if await db_stats.save_palette(palette, canvas_code):
                 logger.info("Palette changed.")
             else:
@@ -115,33 +127,41 @@ class Clock(commands.Cog):
             record_id = None
             logger.warning("Stats page unreachable.")
 
-        ws_client.pause()
-        # update the board
-        try:
-            await self.update_boards()
-            logger.debug("Boards updated.")
-        except ValueError as e:
-            logger.error(f"Couldn't update boards: {e}")
-            ws_client.resume()
-            return
-        except Exception:
-            logger.exception("Couldn't update boards:")
-            ws_client.resume()
-            return
-
-        # save the color stats
-        if record_id:
+        # no new stats, don't download the boards again if they are recent
+        if (
+            not refreshed
+            and time.monotonic() - self.last_board_update < MIN_BOARD_UPDATE_INTERVAL
+        ):
+            logger.debug("Boards recently updated, skipping board update.")
+        else:
+            ws_client.pause()
+            # update the board
             try:
-                await self.save_color_stats(record_id)
-                logger.debug("Color stats saved.")
+                await self.update_boards()
+                self.last_board_update = time.monotonic()
+                logger.debug("Boards updated.")
+            except ValueError as e:
+                logger.error(f"Couldn't update boards: {e}")
+                ws_client.resume()
+                return
             except Exception:
-                logger.exception("Couldn't save color stats:")
+                logger.exception("Couldn't update boards:")
+                ws_client.resume()
+                return
 
-        ws_client.resume()
+            # save the color stats
+            if record_id:
+                try:
+                    await self.save_color_stats(record_id)
+                    logger.debug("Color stats saved.")
+                except Exception:
+                    logger.exception("Couldn't save color stats:")
+
+            ws_client.resume()
 
         # send snapshots
         try:
-            await self.send_snapshots()
+            await self.send_snapshots(canvas_code)
             logger.debug("Snapshot sent.")
         except Exception:
             logger.exception("Couldn't send snapshots:")
@@ -161,16 +181,21 @@ class Clock(commands.Cog):
 
     @tasks.loop(minutes=5)
     async def update_online_count(self):
+        try:
+            canvas_code = await stats.get_canvas_code()
+        except Exception:
+            canvas_code = None
+            logger.exception("Unexpected exception in 'get_canvas_code'")
+
         # save online count
         try:
-            await self.save_online_count()
+            await self.save_online_count(canvas_code)
             logger.debug("Online count saved.")
 
         except Exception:
             logger.exception("Unexpected exception in task 'save_online_count'")
 
         try:
-            canvas_code = await stats.get_canvas_code()
             await tracked_templates.load_all_templates(canvas_code, update=True)
         except Exception:
             tracked_templates.is_loading = False
@@ -178,7 +203,7 @@ class Clock(commands.Cog):
 
         # update template stats
         try:
-            await self.update_template_stats()
+            await self.update_template_stats(canvas_code)
             logger.debug("Template stats saved.")
 
         except Exception:
@@ -202,7 +227,15 @@ class Clock(commands.Cog):
         """Send alerts in all the servers following a user if they hit a milestone."""
 
         users_servers = await db_users.get_all_tracked_users()
+        sem = asyncio.Semaphore(MAX_SENDS)
+
+        async def send_alert(server_id, message):
+            async with sem:
+                channel_id = await db_servers.get_alert_channel(server_id)
+                channel = self.bot.get_channel(int(channel_id))
+                await channel.send(message)
 
+        tasks = []
         for user_id in users_servers.keys():
             values = await db_stats.get_last_two_alltime_counts(user_id)
             if values is None:
@@ -212,50 +245,51 @@ class Clock(commands.Cog):
             old_count = values[2]
 
             if new_count % 1000 < old_count % 1000:
-                servers = users_servers[user_id]
-                for server_id in servers:
-                    channel_id = await db_servers.get_alert_channel(server_id)
-                    try:
-                        channel = self.bot.get_channel(int(channel_id))
-                        await channel.send(
-                            "New milestone for **"
-                            + username
-                            + "**! New count: "
-                            + str(new_count)
-                        )
-                    except Exception:
-                        pass
-
-    async def send_snapshots(self):
+                message = (
+                    "New milestone for **" + username + "**! New count: " + str(new_count)
+                )
+                for server_id in users_servers[user_id]:
+                    tasks.append(send_alert(server_id, message))
+        # the errors are ignored, a failed alert shouldn't stop the others
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def send_snapshots(self, canvas_code):
         """Send snapshots for the servers where a channel is set"""
         channels = await db_servers.get_all_snapshots_channels()
         if not channels:
             return
-        snapshot_saved = False
-        array = stats.palettize_array(stats.board_array)
+        array = stats.get_palettized_board()
         board_img = Image.fromarray(array)
+        # encode the snapshot once and reuse the bytes for every channel
+        board_bytes = await image_to_bytes(board_img)
         snapshot_time = datetime.now(timezone.utc)
         filename = f"snapshot_{snapshot_time.strftime('%FT%H%M')}.png"
+        sem = asyncio.Semaphore(MAX_SENDS)
 
-        for channel_id in channels:
-            try:
+        async def send_snapshot(channel_id):
+            async with sem:
                 channel = self.bot.get_channel(int(channel_id))
                 embed = disnake.Embed(title="Canvas Snapshot", color=0x66C5CC)
                 embed.timestamp = snapshot_time
-                file = await image_to_file(board_img, filename, embed)
-                m = await channel.send(file=file, embed=embed)
-            except Exception:
-                continue
-            else:
-                if not snapshot_saved:
-                    await db_stats.save_snapshot(
-                        snapshot_time.replace(tzinfo=None),
-                        await stats.get_canvas_code(),
-                        get_image_url(m.embeds[0].image),
-                    )
-                    snapshot_saved = True
-
-    async def create_record(self):
+                embed.set_image(url=f"attachment://{filename}")
+                file = disnake.File(BytesIO(board_bytes), filename=filename)
+                return await channel.send(file=file, embed=embed)
+
+        results = await asyncio.gather(
+            *[send_snapshot(channel_id) for channel_id in channels],
+            return_exceptions=True,
+        )
+        # save the URL of the first snapshot sent successfully
+        for m in results:
+            if not isinstance(m, BaseException):
+                await db_stats.save_snapshot(
+                    snapshot_time.replace(tzinfo=None),
+                    canvas_code,
+                    get_image_url(m.embeds[0].image),
+                )
+                break
+
+    async def create_record(self, canvas_code):
         # get the 'last updated' datetime and its timezone
         lastupdated_string = stats.get_last_updated()
         lastupdated = stats.last_updated_to_date(lastupdated_string)
@@ -263,9 +297,6 @@ class Clock(commands.Cog):
         lastupdated = local_to_utc(lastupdated)
         lastupdated = lastupdated.replace(tzinfo=None)  # timezone naive as UTC
 
-        # get the current canvas code
-        canvas_code = await stats.get_canvas_code()
-
         return await db_stats.create_record(lastupdated, canvas_code)
 
     async def save_stats(self, record_id):
@@ -280,66 +311,46 @@ class Clock(commands.Cog):
     async def save_color_stats(self, record_id):
         # get the board with the placeable pixels only
         placeable_board = await stats.get_placable_board()
-        placeable_board_img = Image.fromarray(placeable_board)
-        board_colors = placeable_board_img.getcolors()
+        board_counts = np.bincount(placeable_board.ravel(), minlength=256)
 
-        # use the virgin map as a mask to get the board with placed pixels
+        # use the virgin map as a mask to count the placed pixels only
         virgin_array = stats.virginmap_array
-        placed_board = placeable_board.copy()
-        placed_board[virgin_array != 0] = 255
-        placed_board[virgin_array == 0] = placeable_board[virgin_array == 0]
-        placed_board_img = Image.fromarray(placed_board)
-        placed_colors = placed_board_img.getcolors()
-
-        # Make a dictionary with the color index as key and a dictionnary of
-        # amount and amount_placed as value
-        colors_dict = {}
-        for color_index, color in enumerate(stats.get_palette()):
-            colors_dict[color_index] = {}
-            colors_dict[color_index]["amount"] = 0
-            colors_dict[color_index]["amount_placed"] = 0
-
-        # add board values
-        for color in board_colors:
-            amount = color[0]
-            color_id = color[1]
-            if color_id in colors_dict:
-                colors_dict[color_id]["amount"] = amount
-
-        # add placed board values
-        for color in placed_colors:
-            amount = color[0]
-            color_id = color[1]
-            if color_id in colors_dict:
-                colors_dict[color_id]["amount_placed"] = amount
-
-        await db_stats.save_color_stats(colors_dict, record_id)
-
-    async def save_online_count(self):
+        placed_counts = np.bincount(placeable_board[virgin_array == 0], minlength=256)
+
+        # only keep the counts of the palette colors
+        nb_colors = len(stats.get_palette())
+        await db_stats.save_color_stats(
+            board_counts[:nb_colors].tolist(),
+            placed_counts[:nb_colors].tolist(),
+            record_id,
+        )
+
+    async def save_online_count(self, canvas_code):
         """save the current 'online count' in the database"""
         online = stats.online_count
-        await stats.update_online_count(online)
+        await stats.update_online_count(online, canvas_code)
 
     async def update_boards(self):
         # update the canvas boards
-        await stats.fetch_board()
-        await stats.fetch_virginmap()
-        await stats.fetch_placemap()
+        await asyncio.gather(
+            stats.fetch_board(), stats.fetch_virginmap(), stats.fetch_placemap()
+        )
 
-    async def update_template_stats(self):
+    async def update_template_stats(self, canvas_code):
         """Update all the tracked templates"""
-        canvas_code = await stats.get_canvas_code()
         dt = datetime.utcnow()
         dt = dt.replace(microsecond=0)
+        template_stats = []
         for temp in tracked_templates.list[:]:
             if canvas_code is not None and temp.canvas_code != canvas_code:
                 name = temp.name
                 # await db_templates.delete_template(temp)
-                tracked_templates.list.remove(temp)
+                tracked_templates.remove_template(temp)
                 logger.info(f"Template '{name}' deleted. Reason: new canvas code")
                 continue
             progress = temp.update_progress()
-            await db_templates.create_template_stat(temp, dt, progress)
+            template_stats.append((temp, dt, progress))
+        await db_templates.create_template_stats(template_stats)
         # update the combo and save its progress
         tracked_templates.update_combo(self.bot.user.id, canvas_code)
         combo_progress = tracked_templates.combo.update_progress()
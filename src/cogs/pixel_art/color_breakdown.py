@@ -10,9 +10,15 @@ from utils.discord_utils import (
     get_image_from_message,
     image_to_file,
 )
-from utils.image.image_utils import h_concatenate, hex_str_to_int, hex_to_rgb, rgb_to_hex
+from utils.image.image_utils import (
+    get_pxls_rgb_index,
+    get_visible_colors,
+    h_concatenate,
+    hex_str_to_int,
+    rgb_to_hex,
+)
 from utils.plot_utils import fig2img
-from utils.setup import db_users, stats
+from utils.setup import db_users
 from utils.table_to_image import table_to_image
 from utils.utils import in_executor
 
@@ -51,19 +57,21 @@ class ColorBreakdown(commands.Cog):
         await _colors(self.bot, ctx, input_image)
 
 
-async def _colors(bot: commands.Bot, ctx, input_image, title="Color Breakdown"):
+async def _colors(
+    bot: commands.Bot, ctx, input_image, title="Color Breakdown", image_colors=None
+):
+    """Send the color breakdown of an image, `image_colors` can be given
+    (same format as `get_visible_colors()`) if the colors are already counted"""
 
     pie_chart_limit = 256
     table_limit = 40
     nb_pixels = input_image.size[0] * input_image.size[1]
 
-    # get the colors table
-    image_colors = await bot.loop.run_in_executor(None, input_image.getcolors, nb_pixels)
+    # get the colors table (without the transparent pixels)
     if image_colors is None:
-        return await ctx.send("❌ Unsupported format or image mode.")
-
-    # remove transparent pixels (alpha < 128)
-    image_colors = [c for c in image_colors if (len(c[1]) != 4 or c[1][3] > 128)]
+        image_colors = await bot.loop.run_in_executor(
+            None, get_visible_colors, input_image
+        )
     nb_colors = len(image_colors)
     if nb_colors == 0:
         return await ctx.send(":x: This image doesn't have any visible pixels.")
@@ -134,7 +142,9 @@ async def _colors(bot: commands.Bot, ctx, input_image, title="Color Breakdown"):
         colors_chart = colors
     labels_chart = [d[2] for d in data_chart]  # show the correct percentages as labels
     values_chart = [d[1] for d in data_chart]
-    piechart = get_piechart(labels_chart, values_chart, colors_chart)
+    piechart = await bot.loop.run_in_executor(
+        None, get_piechart, labels_chart, values_chart, colors_chart
+    )
     piechart_img = await fig2img(piechart, 600, 600, 1.5)
 
     # create the message with a header
@@ -166,42 +176,47 @@ def rgb_to_pxlscolor(img_colors):
     color_name is a pxls.space color name, if the RGB doesn't match,
     the color_name will be the hex code"""
 
-    # make a dictionary of the palette where the key is the rgb value and value is the name
-    pxls_palette = stats.get_palette()
-    palette_names = [c["name"] for c in pxls_palette]
-    palette_rgbs = [hex_to_rgb(hex) for hex in [c["value"] for c in pxls_palette]]
-    palette_dict = {palette_rgbs[i]: palette_names[i] for i in range(len(palette_rgbs))}
+    palette_dict = get_pxls_rgb_index()
 
     res_dict = {}
     for color in img_colors:
         amount = color[0]
         rgb = tuple(color[1][:3])
-        color_name = palette_dict.get(rgb) or rgb_to_hex(rgb)
+        hex = rgb_to_hex(rgb)
+        color_name = palette_dict.get(rgb) or hex
 
         if color_name in res_dict:
             res_dict[color_name]["amount"] += amount
         else:
-            res_dict[color_name] = dict(amount=amount, hex=rgb_to_hex(rgb))
+            res_dict[color_name] = dict(amount=amount, hex=hex)
     res_list = [(k, res_dict[k]["amount"], res_dict[k]["hex"]) for k in res_dict.keys()]
     # sort by amount
     res_list.sort(key=lambda x: x[1], reverse=True)
     return res_list
 
 
+# the layout is the same for all the pie charts so it is only created once
+PIECHART_LAYOUT = go.Layout(
+    paper_bgcolor="rgba(0,0,0,0)",
+    plot_bgcolor="rgba(0,0,0,0)",
+    font_color="white",
+    uniformtext_minsize=12,
+    uniformtext_mode="hide",
+    showlegend=False,
+)
+
+
 def get_piechart(labels, values, colors):
-    layout = go.Layout(
-        paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white"
-    )
-    fig = go.Figure(data=[go.Pie(text=labels, values=values, sort=False)], layout=layout)
-    fig.update_traces(
+    pie = go.Pie(
+        text=labels,
+        values=values,
+        sort=False,
         textinfo="text",
         textfont_size=20,
+        textposition="inside",
         marker=dict(colors=colors, line=dict(color="#000000", width=1)),
     )
-    fig.update_traces(textposition="inside")
-    fig.update_layout(uniformtext_minsize=12, uniformtext_mode="hide")
-    fig.update_layout(showlegend=False)
-    return fig
+    return go.Figure(data=[pie], layout=PIECHART_LAYOUT)
 
 
 def setup(bot: commands.Bot):
@@ -140,17 +140,20 @@ async def _highlight(ctx, image_array: np.ndarray, colors, bg_color):
 
     # find the number of pixels non-transparent
     alpha_values = image_array[:, :, 3]
-    total_amount = np.sum(alpha_values == 255)
+    total_amount = np.count_nonzero(alpha_values == 255)
+
+    # view each RGBA pixel as a single uint32 to compare the 4 channels at once
+    image_array = np.ascontiguousarray(image_array, dtype=np.uint8)
+    packed_array = image_array.view(np.uint32)[:, :, 0]
+    packed_colors = np.array(rgba_list, dtype=np.uint8).view(np.uint32)[:, 0]
 
     # create a mask for each color and do a logical or between all the masks
-    res_mask = np.zeros((image_array.shape[0], image_array.shape[1]))
-    res_mask[:, :] = False
+    res_mask = np.zeros(packed_array.shape, dtype=bool)
     color_amounts = []
-    for rgba in rgba_list:
-        mask = np.all(image_array == rgba, axis=2)
-        res_mask = np.logical_or(res_mask, mask)
-        color_amount = np.count_nonzero(mask != 0)
-        color_amounts.append(color_amount)
+    for packed_color in packed_colors:
+        mask = packed_array == packed_color
+        res_mask |= mask
+        color_amounts.append(np.count_nonzero(mask))
     res_mask = ~res_mask
 
     # apply the mask to the canvas array
@@ -117,22 +117,21 @@ class Reduce(commands.Cog):
         if not palette:
             palette_names = ["pxls (current)"]
             rgba_palette = get_rgba_palette()
-            hex_palette = None  # default pxls
         else:
             try:
-                rgba_palette, hex_palette, palette_names = get_colors_from_input(
+                rgba_palette, _, palette_names = get_colors_from_input(
                     palette, accept_colors=True, accept_palettes=True
                 )
             except ValueError as e:
                 return await ctx.send(f":x: {e}")
 
         # reduce the image to the pxls palette
-        img_array = np.array(img)
+        img_array = np.asarray(img)
         reduced_array = await self.bot.loop.run_in_executor(
             None, reduce, img_array, rgba_palette, matching
         )
 
-        total_amount = np.sum(reduced_array != 255)
+        total_amount = np.count_nonzero(reduced_array != 255)
         total_amount = format_number(int(total_amount))
         end = time.time()
 
@@ -143,7 +142,9 @@ class Reduce(commands.Cog):
         embed.description += f"**Size**: {total_amount} pixels ({img.width}x{img.height})"
         embed.set_footer(text=f"Reduced in {round((end-start),3)}s")
 
-        reduced_image = Image.fromarray(stats.palettize_array(reduced_array, hex_palette))
+        reduced_image = Image.fromarray(
+            stats.palettize_array(reduced_array, rgba_palette)
+        )
         reduced_file = await image_to_file(reduced_image, "reduced.png", embed)
 
         await ctx.send(embed=embed, files=[reduced_file])
@@ -1,4 +1,7 @@
+import functools
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import disnake
 import numpy as np
@@ -15,7 +18,8 @@ from utils.discord_utils import (
     image_to_file,
 )
 from utils.image.image_utils import (
-    get_image_scale,
+    count_visible_colors,
+    get_image_scale_cached,
     get_visible_pixels,
     remove_white_space,
 )
@@ -25,6 +29,12 @@ from utils.pxls.template_manager import detemplatize, parse_template
 class Scale(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        # dedicated pool for the CPU heavy downscale work, the kernels release
+        # the GIL so the threads run in parallel
+        self.cpu_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+
+    def cog_unload(self):
+        self.cpu_executor.shutdown(wait=False)
 
     @commands.slash_command(name="downscale")
     async def _downscale(
@@ -76,11 +86,13 @@ class Scale(commands.Cog):
             return await ctx.send(f"❌ {e}")
 
         input_image = remove_white_space(input_image)  # Remove extra space
-        input_image_array = np.array(input_image)
         start = time.time()
         if pixel_size is None:
+            # read-only view, get_image_scale and detemplatize don't write to it
+            input_image_array = np.asarray(input_image)
+            input_image_array.setflags(write=False)
             scale = await self.bot.loop.run_in_executor(
-                None, get_image_scale, input_image_array
+                self.cpu_executor, get_image_scale_cached, input_image_array
             )
         else:
             scale = pixel_size
@@ -111,16 +123,31 @@ class Scale(commands.Cog):
             return await ctx.send(embed=error_embed)
 
         true_width = input_image.width // scale
-        downscaled_array = await self.bot.loop.run_in_executor(
-            None, detemplatize, input_image_array, true_width
-        )
+        true_height = input_image.height // scale
+        if pixel_size is None:
+            downscaled_array = await self.bot.loop.run_in_executor(
+                self.cpu_executor, detemplatize, input_image_array, true_width
+            )
+            downscaled_image = Image.fromarray(downscaled_array)
+        else:
+            # the scale is known: sample the center of each pixel with Pillow
+            downscaled_image = await self.bot.loop.run_in_executor(
+                self.cpu_executor,
+                functools.partial(
+                    input_image.resize,
+                    (true_width, true_height),
+                    Image.NEAREST,
+                    box=(0, 0, true_width * scale, true_height * scale),
+                ),
+            )
         end = time.time()
-        downscaled_image = Image.fromarray(downscaled_array)
 
         embed = disnake.Embed(title="Downscale", color=0x66C5CC)
         embed.description = "• Original pixel size: **{0}x{0}**\n".format(scale)
-        embed.description += "• Image size: `{0.shape[1]}x{0.shape[0]}` → `{1.shape[1]}x{1.shape[0]}`\n".format(
-            input_image_array, downscaled_array
+        embed.description += (
+            "• Image size: `{0.width}x{0.height}` → `{1.width}x{1.height}`\n".format(
+                input_image, downscaled_image
+            )
         )
         embed.description += (
             f"• Pixels: `{format_number(get_visible_pixels(downscaled_image))}`"
@@ -186,7 +213,12 @@ class Scale(commands.Cog):
             )
             return await ctx.send(f"❌ {err_msg}")
 
-        res_image = input_image.resize((final_width, final_height), Image.NEAREST)
+        res_image = await self.bot.loop.run_in_executor(
+            None, input_image.resize, (final_width, final_height), Image.NEAREST
+        )
+        visible_pixels = await self.bot.loop.run_in_executor(
+            None, get_visible_pixels, res_image
+        )
 
         embed = disnake.Embed(title="Upscale", color=0x66C5CC)
         embed.description = "• Final pixel size: **{0}x{0}**\n".format(scale)
@@ -195,7 +227,7 @@ class Scale(commands.Cog):
                 input_image, res_image
             )
         )
-        embed.description += f"• Pixels: `{format_number(get_visible_pixels(res_image))}`"
+        embed.description += f"• Pixels: `{format_number(visible_pixels)}`"
         res_file = await image_to_file(res_image, "upscaled.png", embed=embed)
         await ctx.send(embed=embed, file=res_file)
 
@@ -298,9 +330,23 @@ class Scale(commands.Cog):
                 )
                 raise ValueError(err_msg)
 
-            # resize the input image
-            res_image = input_image.resize((width, new_height), resample_enum)
-            visible_pixels = get_visible_pixels(res_image)
+            # resize the input image, big downsizes with a convolution filter are
+            # first reduced by an integer factor so there is less to convolve
+            reducing_gap = None
+            if ratio >= 2 and resample_enum != Image.NEAREST:
+                reducing_gap = 3.0
+            res_image = await self.bot.loop.run_in_executor(
+                None,
+                functools.partial(
+                    input_image.resize,
+                    (width, new_height),
+                    resample_enum,
+                    reducing_gap=reducing_gap,
+                ),
+            )
+            visible_pixels = await self.bot.loop.run_in_executor(
+                None, get_visible_pixels, res_image
+            )
             embed = disnake.Embed(title="Resize", color=0x66C5CC)
             embed.description = (
                 "• Size: `{0.width}x{0.height}` → `{1.width}x{1.height}`\n".format(
@@ -350,10 +396,12 @@ class Scale(commands.Cog):
         width = image.width
         height = image.height
         total_size = width * height
-        total_visible = get_visible_pixels(image)
-        image_colors = image.getcolors(total_size)
-        image_colors = [c for c in image_colors if (len(c[1]) != 4 or c[1][3] > 128)]
-        total_colors = len(image_colors)
+        total_visible = await self.bot.loop.run_in_executor(
+            None, get_visible_pixels, image
+        )
+        total_colors = await self.bot.loop.run_in_executor(
+            None, count_visible_colors, image
+        )
 
         embed = disnake.Embed(title="Size", color=0x66C5CC)
         embed.description = f" • Visible pixels: `{format_number(total_visible)}`\n"
@@ -1,6 +1,10 @@
+import asyncio
+import functools
 from datetime import datetime, timedelta, timezone
 
 import disnake
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
 from disnake.ext import commands
 
@@ -20,7 +24,7 @@ from utils.setup import db_stats, db_users, stats
 from utils.table_to_image import table_to_image
 from utils.time_converter import format_timezone, round_minutes_down, str_to_td
 from utils.timezoneslib import get_timezone
-from utils.utils import in_executor, shorten_list
+from utils.utils import in_executor
 
 
 class ColorsGraph(commands.Cog):
@@ -94,6 +98,13 @@ class ColorsGraph(commands.Cog):
             dt2 = None
             dt1 = None
 
+        canvas_code = await stats.get_canvas_code()
+        data, palette = await asyncio.gather(
+            db_stats.get_canvas_color_stats(canvas_code, dt1, dt2),
+            db_stats.get_palette(canvas_code),
+        )
+        palette_lut = get_palette_lut(palette)
+
         # format colors in a list
         colors = parsed_args.colors
         if parsed_args.colors:
@@ -106,6 +117,9 @@ class ColorsGraph(commands.Cog):
                     colors.remove(color)
                     colors += found_palette
             for i, c in enumerate(colors):
+                if c.lower() in palette_lut:
+                    colors[i] = c.lower()
+                    continue
                 try:
                     colors[i] = get_color(c, pxls_only=True)[0].lower()
                 except Exception as e:
@@ -116,23 +130,15 @@ class ColorsGraph(commands.Cog):
         if parsed_args.placed:
             placed_opt = True
 
-        canvas_code = await stats.get_canvas_code()
-        data = await db_stats.get_canvas_color_stats(canvas_code, dt1, dt2)
-
-        palette = await db_stats.get_palette(canvas_code)
-
         # initialise a data dictionary for each color
         data_list = []
         for color in palette:
-            color_id = color["color_id"]
-            color_name = color["color_name"]
-            color_hex = "#" + color["color_hex"]
             color_dict = dict(
-                color_id=color_id,
-                color_name=color_name,
-                color_hex=color_hex,
+                color_id=color["color_id"],
+                color_name=color["color_name"],
                 values=[],
                 datetimes=[],
+                **palette_lut[color["color_name"].lower()],
             )
             data_list.append(color_dict)
 
@@ -148,9 +154,10 @@ class ColorsGraph(commands.Cog):
             data_list[color_id]["values"].append(pixels)
             data_list[color_id]["datetimes"].append(dt)
 
-        if parsed_args.last:
-            for d in data_list:
-                d["values"] = [v - d["values"][0] for v in d["values"]]
+        for d in data_list:
+            d["values"] = np.asarray(d["values"], dtype=np.int64)
+            if parsed_args.last and len(d["values"]) > 0:
+                d["values"] -= d["values"][0]
         # create the graph and style
         fig = await make_color_graph(data_list, colors, discord_user["timezone"])
         if fig is None:
@@ -163,7 +170,7 @@ class ColorsGraph(commands.Cog):
             if len(colors) > 0 and d["color_name"].lower() not in colors:
                 continue
             diff_time = d["datetimes"][-1] - d["datetimes"][0]
-            diff_values = d["values"][-1] - d["values"][0]
+            diff_values = int(d["values"][-1] - d["values"][0])
             nb_hour = diff_time / timedelta(hours=1)
             speed_per_hour = diff_values / nb_hour
             speed_per_day = speed_per_hour * 24
@@ -198,6 +205,52 @@ class ColorsGraph(commands.Cog):
         await ctx.send(files=files)
 
 
+def get_palette_lut(palette) -> dict:
+    """Get a dictionary of the canvas palette where the key is the lowercase
+    color name and the value holds the color hex, darkness and graph annotation.
+
+    `palette` is the list of rows returned by `db_stats.get_palette()`, the
+    dictionary is cached for each palette content so it's rebuilt when
+    colors are added to the palette."""
+    if not palette:
+        return {}
+    return _make_palette_lut(
+        tuple((color["color_name"], color["color_hex"]) for color in palette)
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def _make_palette_lut(palette_colors) -> dict:
+    lut = {}
+    for color_name, color_hex in palette_colors:
+        lut[color_name.lower()] = _get_color_info(color_name, "#" + color_hex)
+    return lut
+
+
+@functools.lru_cache(maxsize=512)
+def _get_color_info(color_name, color_hex):
+    rgb = hex_to_rgb(color_hex)
+    dark = is_dark(rgb)
+    if dark:
+        # add an outline to the color name if it's too dark
+        annotation = '<span style = "text-shadow:\
+            -{2}px -{2}px 0 {0},\
+            {2}px -{2}px 0 {0},\
+            -{2}px {2}px 0 {0},\
+            {2}px {2}px 0 {0},\
+            0px {2}px 0px {0},\
+            {2}px 0px 0px {0},\
+            -{2}px 0px 0px {0},\
+            0px -{2}px 0px {0};"><b>{1}</b></span>'.format(
+            rgb_to_hex(lighten_color(rgb, 0.4)),
+            color_name,
+            2,
+        )
+    else:
+        annotation = "<b>%s</b>" % color_name
+    return dict(color_hex=color_hex, rgb=rgb, is_dark=dark, annotation=annotation)
+
+
 @in_executor()
 def make_color_graph(data_list, colors, user_timezone=None):
 
@@ -210,29 +263,35 @@ def make_color_graph(data_list, colors, user_timezone=None):
         annotation_text = f"Timezone: {format_timezone(tz)}"
 
     layout = get_theme("default").get_layout(annotation_text=annotation_text)
-    fig = go.Figure(layout=layout)
-    fig.update_layout(showlegend=False)
 
-    colors_found = False
+    # build all the traces and annotations first so the figure is only
+    # validated once
+    traces = []
+    annotations = list(layout.annotations)
+    limit = 200
+    dates_key = None
     for color in data_list:
         if len(colors) > 0 and color["color_name"].lower() not in colors:
             continue
-        colors_found = True
-
-        values = color["values"]
-        dates = color["datetimes"]
-        dates = [datetime.astimezone(d.replace(tzinfo=timezone.utc), tz) for d in dates]
-
-        # remove some data if we have too much
-        limit = 200
-        if len(values) > limit:
-            values = shorten_list(values, limit)
-            dates = shorten_list(dates, limit)
 
-        fig.add_trace(
-            go.Scatter(
+        # the colors are saved together so they share the same datetimes:
+        # the indexes to keep and the converted dates are only computed once
+        datetimes = color["datetimes"]
+        key = (len(datetimes), datetimes[:1], datetimes[-1:])
+        if key != dates_key:
+            dates_key = key
+            # remove some data if we have too much
+            nb_values = len(datetimes)
+            idx = np.linspace(0, nb_values - 1, min(nb_values, limit))
+            idx = np.round(idx).astype(np.int64)
+            dates = pd.DatetimeIndex(datetimes)[idx].tz_localize("UTC").tz_convert(tz)
+            dates = dates.to_pydatetime()
+
+        traces.append(
+            dict(
+                type="scatter",
                 x=dates,
-                y=values,
+                y=color["values"][idx],
                 mode="lines",
                 name=color["color_name"],
                 line=dict(width=4),
@@ -241,41 +300,30 @@ def make_color_graph(data_list, colors, user_timezone=None):
         )
 
         # add an annotation at the right with the color name
-        if is_dark(hex_to_rgb(color["color_hex"])):
-            # add an outline to the color name if it's too dark
-            text = '<span style = "text-shadow:\
-                -{2}px -{2}px 0 {0},\
-                {2}px -{2}px 0 {0},\
-                -{2}px {2}px 0 {0},\
-                {2}px {2}px 0 {0},\
-                0px {2}px 0px {0},\
-                {2}px 0px 0px {0},\
-                -{2}px 0px 0px {0},\
-                0px -{2}px 0px {0};"><b>{1}</b></span>'.format(
-                rgb_to_hex(lighten_color(hex_to_rgb(color["color_hex"]), 0.4)),
-                color["color_name"],
-                2,
+        annotations.append(
+            dict(
+                xanchor="left",
+                xref="paper",
+                yref="y",
+                x=1.01,
+                y=color["values"][-1],
+                text=color["annotation"],
+                showarrow=False,
+                font=dict(color=color["color_hex"], size=30),
             )
-        else:
-            text = "<b>%s</b>" % color["color_name"]
-
-        fig.add_annotation(
-            xanchor="left",
-            xref="paper",
-            yref="y",
-            x=1.01,
-            y=color["values"][-1],
-            text=text,
-            showarrow=False,
-            font=dict(color=color["color_hex"], size=30),
         )
 
-    if not colors_found:
+    if not traces:
         return None
 
     # add a marge at the right to avoid cropping color names
     longest_name = max([len(c["color_name"]) for c in data_list])
-    fig.update_layout(margin=dict(r=(longest_name + 2) * 20))
+    layout.update(
+        showlegend=False,
+        annotations=annotations,
+        margin=dict(r=(longest_name + 2) * 20),
+    )
+    fig = go.Figure(data=traces, layout=layout)
 
     # add a glow to the dark colors
     add_glow(fig, glow_color="lighten_color", dark_only=True, nb_glow_lines=5)
@@ -1,9 +1,11 @@
+import asyncio
 from datetime import datetime, timedelta, timezone
+from io import BytesIO
 
 import disnake
 import numpy as np
 from disnake.ext import commands
-from PIL import Image, ImageEnhance
+from PIL import Image
 
 from cogs.pixel_art.color_breakdown import _colors
 from cogs.pixel_art.highlight import _highlight
@@ -17,14 +19,39 @@ from utils.discord_utils import (
 )
 from utils.plot_utils import matplotlib_to_plotly
 from utils.pxls.cooldown import get_best_possible
+from utils.pxls.pxls_stats_manager import count_canvas_pixels, make_virginmap_indexes
 from utils.setup import PXLS_URL, db_conn, db_stats, db_users, stats
 from utils.time_converter import format_datetime, round_minutes_down, td_format
 from utils.utils import make_progress_bar
 
+# the parsers are built once and reused, parse_args() doesn't change their state
+BOARD_PARSER = MyParser(add_help=False)
+BOARD_PARSER.add_argument(
+    "-heatmap", action="store", default=None, nargs="*", required=False
+)
+BOARD_PARSER.add_argument(
+    "-nonvirgin", action="store_true", default=False, required=False
+)
+BOARD_PARSER.add_argument(
+    "-virginmap", action="store_true", default=False, required=False
+)
+BOARD_PARSER.add_argument("-initial", action="store_true", default=False, required=False)
+
+HIGHLIGHT_PARSER = MyParser(add_help=False)
+HIGHLIGHT_PARSER.add_argument("colors", type=str, nargs="+")
+HIGHLIGHT_PARSER.add_argument(
+    "-bgcolor", "-bg", nargs="*", type=str, action="store", required=False
+)
+HIGHLIGHT_PARSER.add_argument(
+    "-placed", action="store_true", default=False, required=False
+)
+
 
 class PxlsStats(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
+        # generalstats thumbnail as (last_updated, png bytes)
+        self._board_thumbnail = (None, None)
 
     @commands.slash_command(name="generalstats")
     async def _generalstats(self, inter: disnake.AppCmdInter):
@@ -54,34 +81,45 @@ class PxlsStats(commands.Cog):
         virginmap = stats.virginmap_array
         placemap = stats.placemap_array
         total_amount = board.shape[0] * board.shape[1]
-        total_placeable = np.sum(placemap != 255)
-        total_non_virgin = np.sum(np.logical_and(virginmap == 0, placemap == 0))
+        total_placeable, total_non_virgin = count_canvas_pixels(
+            virginmap.ravel(), placemap.ravel()
+        )
         pixel_per_user = int(total_placed) / int(active_users)
 
         # get canvas info
         canvas_code = await stats.get_canvas_code()
         last_updated = stats.last_updated_to_date(stats.get_last_updated())
-        # find the earliest datetime for the current canvas
+        # the record to calculate the recent filling speed
+        time_interval = 1  # number of days to calculate the recent filling speed
+        time_to_search = round_minutes_down(
+            datetime.utcnow() - timedelta(days=time_interval) - timedelta(minutes=1)
+        )
+        # find the earliest datetime for the current canvas, the online counts and
+        # the recent record (these queries are independent so they run concurrently)
         sql = "SELECT MIN(datetime),datetime FROM record WHERE canvas_code = ?"
-        start_date = await db_conn.sql_select(sql, canvas_code)
+        start_date, data, record = await asyncio.gather(
+            db_conn.sql_select(sql, canvas_code),
+            db_stats.get_general_stat(
+                "online_count", datetime.min, datetime.max, canvas_code=canvas_code
+            ),
+            db_stats.find_record(time_to_search, canvas_code),
+        )
         start_date = start_date[0]["datetime"]
 
         # get average cd/online
-        data = await db_stats.get_general_stat(
-            "online_count", datetime.min, datetime.max, canvas_code=canvas_code
+        online_counts = np.fromiter(
+            (int(e[0]) for e in data if e[0] is not None), dtype=np.int64
         )
-        online_counts = [int(e[0]) for e in data if e[0] is not None]
-        cooldowns = [stats.get_cd(count) for count in online_counts]
         if len(online_counts) == 0:
             average_online = "N/A"
             min_online = "N/A"
             max_online = "N/A"
             average_cd = "N/A"
         else:
-            average_online = sum(online_counts) / len(online_counts)
-            min_online = min(online_counts)
-            max_online = max(online_counts)
-            average_cd = sum(cooldowns) / len(cooldowns)
+            average_online = float(online_counts.mean())
+            min_online = int(online_counts.min())
+            max_online = int(online_counts.max())
+            average_cd = float(np.mean(stats.get_cd(online_counts)))
 
         # calculate the filling speed
         canvas_time = (datetime.utcnow() - start_date) / timedelta(days=1)
@@ -89,11 +127,6 @@ class PxlsStats(commands.Cog):
 
         # calculate the ETA with the filling speed in the last 2 days
         goal = 95  # % of canvas filled
-        time_interval = 1  # number of days to calculate the recent filling speed
-        time_to_search = round_minutes_down(
-            datetime.utcnow() - timedelta(days=time_interval) - timedelta(minutes=1)
-        )
-        record = await db_stats.find_record(time_to_search, canvas_code)
         record_time = round_minutes_down(record["datetime"].replace(tzinfo=timezone.utc))
         sql = (
             "SELECT SUM(amount_placed) AS non_virgin FROM color_stat WHERE record_id = ?"
@@ -190,10 +223,15 @@ class PxlsStats(commands.Cog):
             inline=False,
         )
 
-        # set the board image as thumbnail
-        board_array = stats.palettize_array(board)
-        board_img = Image.fromarray(board_array)
-        f = await image_to_file(board_img, "board.png")
+        # set the board image as thumbnail, the image is only encoded again
+        # when the stats are updated
+        thumbnail_key, board_bytes = self._board_thumbnail
+        if thumbnail_key != last_updated or board_bytes is None:
+            board_bytes = await self.bot.loop.run_in_executor(
+                None, render_board_thumbnail
+            )
+            self._board_thumbnail = (last_updated, board_bytes)
+        f = disnake.File(BytesIO(board_bytes), filename="board.png")
         emb.set_thumbnail(url="attachment://board.png")
 
         await ctx.send(embed=emb, file=f)
@@ -290,19 +328,22 @@ class PxlsStats(commands.Cog):
 
         # get the recent activity stats
         time_intervals = [0.25, 1, 24, 24 * 7]  # in hours
-        time_intervals.append(0.5)
         interval_names = ["15 min", "hour", "day", "week"]
-        record_id_list = []
-        record_list = []
+        # the last 30 minutes aren't shown, they're only used for the idle status
+        status_intervals = [0.5]
+        all_intervals = time_intervals + status_intervals
         now_time = datetime.now(timezone.utc)
         current_canvas_code = await stats.get_canvas_code()
-        for time_interval in time_intervals:
-            time = now_time - timedelta(hours=time_interval) - timedelta(minutes=1)
-            time = round_minutes_down(time)
-            record = await db_stats.find_record(time, current_canvas_code)
-            record_id = record["record_id"]
-            record_id_list.append(record_id)
-            record_list.append(record)
+        times = [
+            round_minutes_down(
+                now_time - timedelta(hours=time_interval) - timedelta(minutes=1)
+            )
+            for time_interval in all_intervals
+        ]
+        record_list = await db_stats.find_records(times, current_canvas_code)
+        record_id_list = [record["record_id"] for record in record_list]
+        # the same record can be the closest to several times
+        unique_record_ids = tuple(dict.fromkeys(record_id_list))
 
         sql = """
             SELECT canvas_count, alltime_count, record_id
@@ -312,33 +353,38 @@ class PxlsStats(commands.Cog):
             AND record_id IN ({})
             ORDER BY record_id
         """.format(
-            ", ".join(["?"] * len(record_id_list))
+            ", ".join(["?"] * len(unique_record_ids))
         )
-        rows = await db_conn.sql_select(sql, (user_id,) + tuple(record_id_list))
-
-        diff_list = []
-        for id in record_id_list:
-            diff = None
-            for row in rows:
-                # calcluate the difference for each time if the value is not null
-                # and compare the canvas count if the alltime count is null
-                if row["record_id"] == id:
-                    if alltime_count is not None and row["alltime_count"] is not None:
-                        diff = alltime_count - row["alltime_count"]
-                    elif canvas_count is not None and row["canvas_count"] is not None:
-                        diff = canvas_count - row["canvas_count"]
-            diff_list.append(diff)
+        rows = await db_conn.sql_select(sql, (user_id,) + unique_record_ids)
+
+        rows_by_id = {row["record_id"]: row for row in rows}
+
+        def _get_diff(row):
+            # calcluate the difference for each time if the value is not null
+            # and compare the canvas count if the alltime count is null
+            if row is None:
+                return None
+            if alltime_count is not None and row["alltime_count"] is not None:
+                return alltime_count - row["alltime_count"]
+            elif canvas_count is not None and row["canvas_count"] is not None:
+                return canvas_count - row["canvas_count"]
+            return None
+
+        diffs = {
+            time_interval: _get_diff(rows_by_id.get(id))
+            for time_interval, id in zip(all_intervals, record_id_list)
+        }
 
         recent_activity = [
-            f"• Last {interval_names[i]}: `{format_number(diff_list[i])}`"
-            for i in range(len(diff_list) - 1)
+            f"• Last {interval_name}: `{format_number(diffs[time_interval])}`"
+            for interval_name, time_interval in zip(interval_names, time_intervals)
         ]
         recent_activity_text = "\n".join(recent_activity)
         recent_activity_text += f"\n\nLast updated: {last_updated}"
 
         # get the status
-        last_15m = diff_list[0]
-        last_30m = diff_list[-1]
+        last_15m = diffs[0.25]
+        last_30m = diffs[0.5]
         last_online_date = None
         session_start_str = None
 
@@ -392,7 +438,7 @@ class PxlsStats(commands.Cog):
                 if canvas_code != current_canvas_code:
                     last_online_date += f" `(c{canvas_code})`"
             else:
-                last_online_date = await db_stats.find_record(datetime.min)
+                last_online_date = await db_stats.get_first_record()
                 last_online_date = last_online_date["datetime"]
                 last_online_date = f"*over {format_datetime(last_online_date, 'R')}*"
             # inactive
@@ -472,22 +518,8 @@ class PxlsStats(commands.Cog):
 
     async def board(self, ctx, *args):
         # parse the args
-        parser = MyParser(add_help=False)
-        parser.add_argument(
-            "-heatmap", action="store", default=None, nargs="*", required=False
-        )
-        parser.add_argument(
-            "-nonvirgin", action="store_true", default=False, required=False
-        )
-        parser.add_argument(
-            "-virginmap", action="store_true", default=False, required=False
-        )
-        parser.add_argument(
-            "-initial", action="store_true", default=False, required=False
-        )
-
         try:
-            parsed_args = parser.parse_args(args)
+            parsed_args = BOARD_PARSER.parse_args(args)
         except ValueError as e:
             return await ctx.send(f"❌ {e}")
 
@@ -507,57 +539,62 @@ class PxlsStats(commands.Cog):
                         "❌ The opacity value must be between 0 and 100."
                     )
 
+        board_array = stats.board_array
+        virginmap = stats.virginmap_array
+        placemap = stats.placemap_array
+
         # virginmap
         if parsed_args.virginmap:
-            array = stats.virginmap_array.copy()
-            array[array == 255] = 1
-            array[stats.placemap_array != 0] = 255
+            array = make_virginmap_indexes(virginmap, placemap)
             array = stats.palettize_array(array, palette=["#000000", "#00DD00"])
             title = "Canvas Virginmap"
         # heatmap
         elif heatmap_opacity is not None:
-            # get the heatmap
-            array = await stats.fetch_heatmap()
+            # get the heatmap while the canvas board is palettized
+            heatmap_task = asyncio.create_task(stats.fetch_heatmap())
+            canvas_array = await self.bot.loop.run_in_executor(
+                None, stats.palettize_array, board_array
+            )
+            array = await heatmap_task
             # invert the values to have the inactive pixels at 255 (which is the default transparent value)
             array = 255 - array
             heatmap_palette = matplotlib_to_plotly("plasma_r", 255)
-            array = stats.palettize_array(array, heatmap_palette)
-            # get the canvas board
-            canvas_array = stats.board_array
-            canvas_array = stats.palettize_array(canvas_array)
+            array = await self.bot.loop.run_in_executor(
+                None, stats.palettize_array, array, heatmap_palette
+            )
             title = "Canvas Heatmap"
         # non-virgin board
         elif parsed_args.nonvirgin:
             placeable_board = await stats.get_placable_board()
-            virgin_array = stats.virginmap_array
-            array = placeable_board.copy()
-            array[virgin_array != 0] = 255
-            array[virgin_array == 0] = placeable_board[virgin_array == 0]
+            array = np.where(virginmap != 0, np.uint8(255), placeable_board)
             array = stats.palettize_array(array)
             title = "Current Board (non-virgin pixels)"
         # initial board
         elif parsed_args.initial:
             array = await stats.fetch_initial_canvas()
-            array = stats.palettize_array(array)
+            array = await self.bot.loop.run_in_executor(
+                None, stats.palettize_array, array
+            )
             title = "Initial Board"
         # current board
         else:
-            array = stats.board_array
-            array = stats.palettize_array(array)
+            array = stats.palettize_array(board_array)
             title = "Current Board"
 
         if heatmap_opacity is not None:
-            # paste the heatmap image on top of the darken board
-            heatmap_img = Image.fromarray(array)
+            # paste the heatmap on top of the darken board
+            # (canvas_array is a new array so it can be edited in place)
+            canvas_array[:, :, :3] = canvas_array[:, :, :3] * np.float32(
+                heatmap_opacity / 100
+            )
+            heatmap_mask = array[:, :, 3] != 0
+            canvas_array[heatmap_mask] = array[heatmap_mask]
             board_img = Image.fromarray(canvas_array)
-            enhancer = ImageEnhance.Brightness(board_img)
-            board_img = enhancer.enhance(heatmap_opacity / 100)
-            board_img.paste(heatmap_img, (0, 0), heatmap_img)
         else:
             board_img = Image.fromarray(array)
         embed = disnake.Embed(title=title, color=0x66C5CC)
         embed.timestamp = datetime.now(timezone.utc)
-        file = await image_to_file(board_img, "board.png", embed)
+        file = await image_to_file(board_img, "board.webp", embed)
         await ctx.send(file=file, embed=embed)
 
     @commands.slash_command(name="canvascolors")
@@ -588,16 +625,18 @@ class PxlsStats(commands.Cog):
         if "-placed" in options or "-p" in options:
             # use the virgin map as a mask to get the board with placed pixels
             virgin_array = stats.virginmap_array
-            placed_board = placeable_board.copy()
-            placed_board[virgin_array != 0] = 255
-            placed_board[virgin_array == 0] = placeable_board[virgin_array == 0]
-            img = Image.fromarray(stats.palettize_array(placed_board))
+            board = np.where(virgin_array != 0, np.uint8(255), placeable_board)
             title = "Canvas colors breakdown (non-virgin pixels only)"
         else:
-            img = Image.fromarray(stats.palettize_array(placeable_board))
+            board = placeable_board
             title = "Canvas color breakdown"
 
-        await _colors(self.bot, ctx, img, title)
+        # count the palette indexes directly instead of the palettized colors
+        image_colors = await self.bot.loop.run_in_executor(
+            None, stats.count_colors, board
+        )
+        img = Image.fromarray(stats.palettize_array(board))
+        await _colors(self.bot, ctx, img, title, image_colors)
 
     @commands.slash_command(name="canvashighlight")
     async def _canvashighlight(
@@ -646,14 +685,8 @@ class PxlsStats(commands.Cog):
     async def canvashighlight(self, ctx, *args):
         "Highlight the selected colors on the canvas"
         # parse the arguemnts
-        parser = MyParser(add_help=False)
-        parser.add_argument("colors", type=str, nargs="+")
-        parser.add_argument(
-            "-bgcolor", "-bg", nargs="*", type=str, action="store", required=False
-        )
-        parser.add_argument("-placed", action="store_true", default=False, required=False)
         try:
-            parsed_args = parser.parse_args(args)
+            parsed_args = HIGHLIGHT_PARSER.parse_args(args)
         except ValueError as e:
             return await ctx.send(f"❌ {e}")
 
@@ -667,5 +700,14 @@ class PxlsStats(commands.Cog):
         await _highlight(ctx, array, parsed_args.colors.copy(), parsed_args.bgcolor)
 
 
+def render_board_thumbnail() -> bytes:
+    """Palettize the current board and encode it as PNG bytes
+    (blocking, meant to be run in an executor)"""
+    board_img = Image.fromarray(stats.get_palettized_board())
+    with BytesIO() as image_binary:
+        board_img.save(image_binary, "PNG", compress_level=1)
+        return image_binary.getvalue()
+
+
 def setup(bot: commands.Bot):
     bot.add_cog(PxlsStats(bot))
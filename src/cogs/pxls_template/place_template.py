@@ -1,7 +1,5 @@
 import asyncio
-import re
 import time
-from io import BytesIO
 
 import disnake
 import numpy as np
@@ -11,13 +9,21 @@ from PIL import Image
 from utils.arguments_parser import MyParser
 from utils.discord_utils import (
     IMAGE_URL_REGEX,
+    bytes_to_image,
     format_number,
     get_image_from_message,
     get_image_url,
     image_to_file,
 )
 from utils.image.image_utils import get_builtin_palette
-from utils.pxls.template import STYLES, get_style, parse_style_image, reduce, templatize
+from utils.pxls.template import (
+    STYLES,
+    STYLES_AVAILABLE,
+    get_style,
+    parse_style_image,
+    reduce,
+    templatize,
+)
 from utils.setup import stats
 from utils.utils import get_content
 
@@ -108,7 +114,7 @@ class PlaceTemplate(commands.Cog):
 
         start = time.time()
         # check on the style
-        if style_name and re.match(IMAGE_URL_REGEX, style_name):
+        if style_name and IMAGE_URL_REGEX.match(style_name):
             # if the style is an image URL, we try to use the image as style
             style_url = style_name
             try:
@@ -116,8 +122,8 @@ class PlaceTemplate(commands.Cog):
             except Exception as e:
                 await ctx.send(f"❌ {e}")
                 return False
-            style_image = Image.open(BytesIO(style_image_bytes))
-            style_image = style_image.convert("RGBA")
+            # decode the style off the event loop, it is already RGBA for the parsing
+            style_image = await bytes_to_image(style_image_bytes)
             style_array, style_size = parse_style_image(style_image)
             if style_array is None:
                 await ctx.send(
@@ -135,12 +141,7 @@ class PlaceTemplate(commands.Cog):
                 style_name = "dotted"  # default style
             style = get_style(style_name)
             if not style:
-                styles_available = "**Available Styles:**\n"
-                for s in STYLES:
-                    styles_available += ("\t• {0} ({1}x{1})\n").format(
-                        s["name"], s["size"]
-                    )
-                await ctx.send(f"❌ Unknown style '{style_name}'.\n{styles_available}")
+                await ctx.send(f"❌ Unknown style '{style_name}'.\n{STYLES_AVAILABLE}")
                 return False
 
         # check on the size
@@ -173,7 +174,7 @@ class PlaceTemplate(commands.Cog):
         oy = int(oy) if (oy and str(oy).isdigit()) else 0
 
         # reduce the image to the r/place palette
-        img_array = np.array(img)
+        img_array = np.asarray(img)
         palette = get_builtin_palette("place", as_rgba=True)
         loop = asyncio.get_running_loop()
         reduced_array = await loop.run_in_executor(
@@ -195,7 +196,7 @@ class PlaceTemplate(commands.Cog):
             None, templatize, style, canvas, glow_opacity, "place"
         )
         template_image = Image.fromarray(template_array)
-        total_amount = np.sum(reduced_array != 255)
+        total_amount = np.count_nonzero(reduced_array != 255)
         total_amount = format_number(int(total_amount))
         end = time.time()
 
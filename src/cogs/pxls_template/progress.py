@@ -229,7 +229,7 @@ class Progress(commands.Cog):
                 board[board == 255] = 1
                 palette = ["#000000", "#00FF00"]
             cropped_board = template.crop_array_to_template(board)
-            cropped_board[~template.placeable_mask] = 255
+            cropped_board = np.where(template.placeable_mask, cropped_board, 255)
             progress_image = Image.fromarray(
                 stats.palettize_array(cropped_board, palette)
             )
@@ -238,7 +238,7 @@ class Progress(commands.Cog):
             heatmap = 255 - heatmap
             palette = matplotlib_to_plotly("plasma_r", 255)
             cropped_heatmap = template.crop_array_to_template(heatmap)
-            cropped_heatmap[~template.placeable_mask] = 255
+            cropped_heatmap = np.where(template.placeable_mask, cropped_heatmap, 255)
             cropped_heatmap = stats.palettize_array(cropped_heatmap, palette)
             progress_image = await template.get_preview_image(cropped_heatmap)
         elif display == "virginabuse":
@@ -1,10 +1,8 @@
 import asyncio
 import os
-import re
 import time
 import urllib.parse
 from datetime import timedelta
-from io import BytesIO
 
 import disnake
 import numpy as np
@@ -16,14 +14,17 @@ from utils.discord_utils import (
     IMAGE_URL_REGEX,
     AuthorView,
     autocomplete_builtin_palettes,
+    bytes_to_image,
     format_number,
     get_image_from_message,
     get_image_url,
+    image_to_bytes,
     image_to_file,
 )
-from utils.image.image_utils import get_colors_from_input, remove_white_space
+from utils.image.image_utils import crop_white_space, get_colors_from_input
 from utils.pxls.template import (
     STYLES,
+    STYLES_AVAILABLE,
     get_rgba_palette,
     get_style,
     parse_style_image,
@@ -35,13 +36,32 @@ from utils.setup import PXLS_URL, db_stats, db_users, imgur_app, s3compat_app, s
 from utils.time_converter import td_format
 from utils.utils import get_content
 
+# the parser is built once and reused, parse_args() doesn't change its state
+TEMPLATE_PARSER = MyParser(add_help=False)
+TEMPLATE_PARSER.add_argument("url", action="store", nargs="*")
+TEMPLATE_PARSER.add_argument("-title", action="store", required=False)
+TEMPLATE_PARSER.add_argument("-style", action="store", required=False)
+TEMPLATE_PARSER.add_argument("-glow", action="store_true", default=False)
+TEMPLATE_PARSER.add_argument("-ox", action="store", required=False)
+TEMPLATE_PARSER.add_argument("-oy", action="store", required=False)
+TEMPLATE_PARSER.add_argument(
+    "-host", choices=["s3compat", "discord", "imgur"], default="s3compat"
+)
+TEMPLATE_PARSER.add_argument("-nocrop", action="store_true", default=False)
+TEMPLATE_PARSER.add_argument("-matching", choices=["fast", "accurate"], required=False)
+TEMPLATE_PARSER.add_argument("-palette", action="store", nargs="*")
+
 
 class TemplateView(AuthorView):
-    def __init__(self, author: disnake.User, template_url, message, embed, has_title):
+    def __init__(
+        self, author: disnake.User, template_url, message, embed, has_title, info=""
+    ):
         super().__init__(author, timeout=300)
         self.template_url = template_url
         self.message = message
         self.embed: disnake.Embed = embed
+        # the template info lines after the title, to re-render the field on title change
+        self.info = info
         self.children.insert(
             0, disnake.ui.Button(label="Open Template", url=self.template_url)
         )
@@ -101,8 +121,8 @@ class TemplateView(AuthorView):
         self.embed.set_field_at(
             -1, name="Template Link", value=self.template_url, inline=False
         )
-        self.embed._fields[0]["value"] = self.embed._fields[0]["value"].replace(
-            "N/A", title
+        self.embed.set_field_at(
+            0, name="**Template Info**", value=f"Title: `{title}`\n{self.info}"
         )
         await button_inter.message.edit(view=self, embed=self.embed)
         # confirmation message (because we HAVE to respond something to the modal inter)
@@ -189,20 +209,8 @@ class Template(commands.Cog):
     )
     async def p_template(self, ctx, *args):
 
-        parser = MyParser(add_help=False)
-        parser.add_argument("url", action="store", nargs="*")
-        parser.add_argument("-title", action="store", required=False)
-        parser.add_argument("-style", action="store", required=False)
-        parser.add_argument("-glow", action="store_true", default=False)
-        parser.add_argument("-ox", action="store", required=False)
-        parser.add_argument("-oy", action="store", required=False)
-        parser.add_argument("-host", choices=["s3compat", "discord", "imgur"], default="s3compat")
-        parser.add_argument("-nocrop", action="store_true", default=False)
-        parser.add_argument("-matching", choices=["fast", "accurate"], required=False)
-        parser.add_argument("-palette", action="store", nargs="*")
-
         try:
-            parsed_args = parser.parse_args(args)
+            parsed_args = TEMPLATE_PARSER.parse_args(args)
         except ValueError as e:
             return await ctx.send(f"❌ {e}")
         url = parsed_args.url[0] if parsed_args.url else None
@@ -236,10 +244,18 @@ class Template(commands.Cog):
         matching="fast",
         palette=None,
     ):
+        # if the style is an image URL, start downloading it while the input image
+        # is fetched
+        style_download = None
+        if style_name and IMAGE_URL_REGEX.match(style_name):
+            style_download = asyncio.ensure_future(get_content(style_name, "image"))
+
         # get the image from the message
         try:
             img, url = await get_image_from_message(ctx, image_url)
         except ValueError as e:
+            if style_download:
+                style_download.cancel()
             await ctx.send(f"❌ {e}")
             return False
 
@@ -254,16 +270,16 @@ class Template(commands.Cog):
 
         start = time.time()
         # check on the style
-        if style_name and re.match(IMAGE_URL_REGEX, style_name):
+        if style_download:
             # if the style is an image URL, we try to use the image as style
             style_url = style_name
             try:
-                style_image_bytes = await get_content(style_url, "image")
+                style_image_bytes = await style_download
             except Exception as e:
                 await ctx.send(f"❌ {e}")
                 return False
-            style_image = Image.open(BytesIO(style_image_bytes))
-            style_image = style_image.convert("RGBA")
+            # decode the style off the event loop, it is already RGBA for the parsing
+            style_image = await bytes_to_image(style_image_bytes)
             style_array, style_size = parse_style_image(style_image)
             if style_array is None:
                 await ctx.send(
@@ -282,12 +298,7 @@ class Template(commands.Cog):
                 style_name = "custom"  # default style
             style = get_style(style_name)
             if not style:
-                styles_available = "**Available Styles:**\n"
-                for s in STYLES:
-                    styles_available += ("\t• {0} ({1}x{1})\n").format(
-                        s["name"], s["size"]
-                    )
-                await ctx.send(f"❌ Unknown style `{style_name}`.\n{styles_available}")
+                await ctx.send(f"❌ Unknown style `{style_name}`.\n{STYLES_AVAILABLE}")
                 return False
             style_name = f"`{style['name']}{' (+ glow)' if glow else ''}`"
 
@@ -316,11 +327,14 @@ class Template(commands.Cog):
                 return False
 
         # crop the white space around the image
+        # (on a view of the image array so the pixels aren't copied before reduce)
+        img_array = np.asarray(img)
         if not (nocrop):
-            img = remove_white_space(img)
+            img_array = crop_white_space(img_array)
+        img_height, img_width = img_array.shape[:2]
 
         # check on the size
-        output_size = img.width * img.height * style["size"] ** 2
+        output_size = img_width * img_height * style["size"] ** 2
         limit = int(100e6)
         if output_size > limit:
             msg = f"You're trying to generate a **{format_number(output_size)}** pixels image.\n"
@@ -336,7 +350,6 @@ class Template(commands.Cog):
             return False
 
         # reduce the image to the given palette
-        img_array = np.array(img)
         loop = asyncio.get_running_loop()
         reduced_array = await loop.run_in_executor(
             None, reduce, img_array, rgba_palette, matching
@@ -348,18 +361,25 @@ class Template(commands.Cog):
             None, templatize, style, reduced_array, glow_opacity, rgba_palette
         )
         template_image = Image.fromarray(template_array)
-        total_amount = int(np.sum(reduced_array != 255))
+        total_amount = np.count_nonzero(reduced_array != 255)
         processing_time = round(time.time() - start, 3)
 
+        # start encoding the image in the executor while the ETA is calculated
+        if host == "discord":
+            encoded_image = image_to_file(template_image, "template.png")
+        else:
+            encoded_image = image_to_bytes(template_image)
+
         # Calculate an ETA
         estimate = None
         discord_user = await db_users.get_discord_user(ctx.author.id)
         pxls_user_id = discord_user["pxls_user_id"]
         if pxls_user_id:
             try:
-                pxls_name = await db_users.get_pxls_user_name(pxls_user_id)
+                pxls_name, canvas_code = await asyncio.gather(
+                    db_users.get_pxls_user_name(pxls_user_id), stats.get_canvas_code()
+                )
                 canvas_stats = stats.get_canvas_stat(pxls_name) or 0
-                canvas_code = await stats.get_canvas_code()
                 canvas_start = await db_stats.get_canvas_start_date(canvas_code)
                 last_updated = stats.last_updated_to_date(stats.get_last_updated())
                 last_updated = last_updated.replace(tzinfo=None)
@@ -381,15 +401,17 @@ class Template(commands.Cog):
         embed = disnake.Embed(title="**Template**", color=0x66C5CC)
         embed.set_author(name=ctx.author)
 
-        template_info = f"Title: `{title if title else 'N/A'}`\n"
-        template_info += f"Style: {style_name}\n"
+        template_info = f"Style: {style_name}\n"
         template_info += f"Host: `{host}`\n"
 
         if palette:
             template_info += f"Palette: {', '.join(palette_names)}\n"
-        embed.add_field(name="**Template Info**", value=template_info)
+        embed.add_field(
+            name="**Template Info**",
+            value=f"Title: `{title if title else 'N/A'}`\n{template_info}",
+        )
         template_size = f"Size: `{format_number(total_amount)}` pixels\n"
-        template_size += f"Dimensions: `{img.width} x {img.height}`\n"
+        template_size += f"Dimensions: `{img_width} x {img_height}`\n"
         embed.add_field(name="**Template Size**", value=template_size)
 
         if estimate:
@@ -401,7 +423,7 @@ class Template(commands.Cog):
             start = time.time()
             if host == "imgur":
                 try:
-                    template_image_url = await imgur_app.upload_image(template_image)
+                    template_image_url = await imgur_app.upload_image(await encoded_image)
                 except ValueError as e:
                     await ctx.send(f":x: {e}")
                     return False
@@ -424,7 +446,9 @@ class Template(commands.Cog):
                         "pxls_user_id": f"{pxls_user_id}",
                         "canvas_code": f"{canvas_code}",
                     }
-                    template_image_url = await s3compat_app.upload_image(template_image, metadata)
+                    template_image_url = await s3compat_app.upload_image(
+                        await encoded_image, metadata
+                    )
                 except ValueError as e:
                     await ctx.send(f":x: {e}")
                     return False
@@ -441,7 +465,7 @@ class Template(commands.Cog):
 
             # create a template link with the uploaded image
             template_url = make_template_url(
-                template_image_url, img.width, img.height, ox, oy, title
+                template_image_url, img_width, img_height, ox, oy, title
             )
             # update the embed with the link in a new field
             embed.set_thumbnail(url=template_image_url)
@@ -453,7 +477,9 @@ class Template(commands.Cog):
                 )
             )
             # send the embed and view
-            view = TemplateView(ctx.author, template_url, None, embed, bool(title))
+            view = TemplateView(
+                ctx.author, template_url, None, embed, bool(title), template_info
+            )
             m = await ctx.send(embed=embed, view=view)
             if isinstance(ctx, (disnake.AppCmdInter, disnake.MessageInteraction)):
                 m = await ctx.original_message()
@@ -464,7 +490,7 @@ class Template(commands.Cog):
         else:
             # upload the template image in the embed thumbnail
             start = time.time()
-            file = await image_to_file(template_image, "template.png")
+            file = await encoded_image
             embed.set_thumbnail(url="attachment://template.png")
             m = await ctx.send(embed=embed, file=file)
             if isinstance(ctx, (disnake.AppCmdInter, disnake.MessageInteraction)):
@@ -474,7 +500,7 @@ class Template(commands.Cog):
             # create a template link with the sent image
             template_image_url = get_image_url(m.embeds[0].thumbnail)
             template_url = make_template_url(
-                template_image_url, img.width, img.height, ox, oy, title
+                template_image_url, img_width, img_height, ox, oy, title
             )
 
             # update the embed with the link in a new field
@@ -487,7 +513,9 @@ class Template(commands.Cog):
             )
 
             # update the embed and view
-            view = TemplateView(ctx.author, template_url, m, embed, bool(title))
+            view = TemplateView(
+                ctx.author, template_url, m, embed, bool(title), template_info
+            )
             await m.edit(embed=embed, view=view)
             return True
 
@@ -497,10 +525,7 @@ class Template(commands.Cog):
         aliases=["style"],
     )
     async def styles(self, ctx):
-        styles_available = "**Available Styles:**\n"
-        for s in STYLES:
-            styles_available += ("\t• {0} ({1}x{1})\n").format(s["name"], s["size"])
-        return await ctx.send(styles_available)
+        return await ctx.send(STYLES_AVAILABLE)
 
 
 def make_template_url(template_image_url, width, height, ox=None, oy=None, title=None):
@@ -199,11 +199,9 @@ class TemplateCrop(commands.Cog):
         # replace wrong pixels with the current board
         elif type == "replacewrongpixels":
             template.update_progress()
-            wrong_pixels_mask = np.logical_and(
-                ~template.placed_mask, template.placeable_mask
-            )
+            wrong_pixels_mask = template.get_wrong_pixels_mask()
             cropped_board = template.crop_array_to_template(stats.board_array)
-            res_array[wrong_pixels_mask == 1] = cropped_board[wrong_pixels_mask == 1]
+            res_array[wrong_pixels_mask] = cropped_board[wrong_pixels_mask]
 
         if np.all(res_array == 255):
             return await ctx.send("❌ No placeable pixels in the cropped template.")
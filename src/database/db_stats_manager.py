@@ -459,6 +459,55 @@ class DbStatsManager:
         res = await self.db.sql_select(sql, (dt))
         return res[0]
 
+    async def get_first_record(self, canvas_code=None):
+        """get the oldest record in the database (same as `find_record(datetime.min)`)
+        using the datetime index instead of comparing every record
+        :param canvas_code: the canvas to find the record in, if None, will search among all the canvases"""
+        if canvas_code is None:
+            canvas_condition = "canvas_code IS NOT NULL"
+            params = ()
+        else:
+            canvas_condition = "canvas_code = ?"
+            params = (str(canvas_code),)
+        sql = f"""
+            SELECT record_id, datetime, canvas_code
+            FROM record
+            WHERE {canvas_condition}
+            ORDER BY datetime
+            LIMIT 1
+        """
+        res = await self.db.sql_select(sql, params)
+        return res[0]
+
+    async def find_records(self, dts: list, canvas_code=None):
+        """find the records with the closest date to each of the given dates
+        in a single query, return the records in the same order as `dts`
+        :param dts: the list of datetimes to find
+        :param canvas_code: the canvas to find the records in, if None, will search among all the canvases"""
+        if canvas_code is None:
+            canvas_condition = "canvas_code IS NOT NULL"  # to get all the canvas codes
+            canvas_param = ()
+        else:
+            canvas_condition = "canvas_code = ?"
+            canvas_param = (str(canvas_code),)
+
+        sql = """
+            WITH target(idx, dt) AS (VALUES {})
+            SELECT
+                record.record_id,
+                record.datetime,
+                record.canvas_code,
+                min(abs(JulianDay(record.datetime) - JulianDay(target.dt)))*24*3600 as diff_with_time
+            FROM target
+            LEFT JOIN record ON record.{}
+            GROUP BY target.idx
+            ORDER BY target.idx
+            """.format(
+            ", ".join(["(?, ?)"] * len(dts)), canvas_condition
+        )
+        params = tuple(p for i, dt in enumerate(dts) for p in (i, dt)) + canvas_param
+        return await self.db.sql_select(sql, params)
+
         # general stats functions #
 
     async def get_general_stat(self, name, dt1, dt2, canvas_code=None):
@@ -520,17 +569,17 @@ class DbStatsManager:
                 pass
         return added
 
-    async def save_color_stats(self, colors_dict: dict, record_id: int):
-        """Save the color stats"""
+    async def save_color_stats(self, amounts, amounts_placed, record_id: int):
+        """Save the color stats, `amounts` and `amounts_placed` are sequences
+        indexed by color ID"""
 
         # get the values to insert
-        values_list = []
-        for color_id in colors_dict.keys():
-            amount = colors_dict[color_id]["amount"]
-            amount_placed = colors_dict[color_id]["amount_placed"]
-
-            values = (record_id, color_id, amount, amount_placed)
-            values_list.append(values)
+        values_list = [
+            (record_id, color_id, int(amount), int(amount_placed))
+            for color_id, (amount, amount_placed) in enumerate(
+                zip(amounts, amounts_placed)
+            )
+        ]
 
         sql = """
         INSERT INTO color_stat (record_id, color_id, amount, amount_placed)
@@ -638,7 +687,7 @@ class DbStatsManager:
 
         if canvas:
             # find the record_id of the canvas start
-            first_canvas_record = await self.find_record(datetime.min, canvas_code)
+            first_canvas_record = await self.get_first_record(canvas_code)
             first_canvas_record_dt = first_canvas_record["datetime"]
             sql = """
                 SELECT pxls_user_stat.record_id, canvas_code
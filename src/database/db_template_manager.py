@@ -88,6 +88,29 @@ class DbTemplateManager:
         sql = "INSERT INTO template_stat(template_id, datetime, progress) VALUES(?, ?, ?)"
         return await self.db.sql_insert(sql, (template_id, datetime, progress))
 
+    async def create_template_stats(self, template_stats: list):
+        """Add many template stats in the database at once, `template_stats` is a
+        list of `(template, datetime, progress)`, the templates not found in the
+        database are ignored"""
+        values_list = [
+            (datetime, progress, t.name, t.canvas_code, t.owner_id, t.hidden)
+            for t, datetime, progress in template_stats
+        ]
+        sql = """
+            INSERT INTO template_stat(template_id, datetime, progress)
+            SELECT id, ?, ?
+            FROM template
+            WHERE name = ? AND canvas_code = ? and owner_id = ? and hidden = ?
+        """
+        # create a db connection and insert all the values in the db
+        await self.db.create_connection()
+        async with self.db.conn.cursor() as cur:
+            await cur.execute("BEGIN TRANSACTION;")
+            await cur.executemany(sql, values_list)
+            await cur.execute("COMMIT;")
+        await self.db.conn.commit()
+        await self.db.close_connection()
+
     async def update_template(self, t: "Template", new_url, new_name, new_owner_id):
         """Update a template URL, return None"""
         template_id = await self.get_template_id(t)
@@ -22,21 +22,7 @@ def parse_leaderboard_args(args, user_timezone: timezone = None):
         'before': <datetime> | None,
         'after': <datetime> | None
     }"""
-    parser = MyParser(add_help=False)
-    parser.add_argument("names", type=str, nargs="*", default=[])
-    parser.add_argument("-canvas", "-c", action="store_true", default=False)
-    parser.add_argument(
-        "-lines", metavar="<number>", action="store", type=check_lines, default=15
-    )
-    parser.add_argument("-graph", "-g", action="store_true", default=False)
-    parser.add_argument("-bars", "-b", action="store_true", default=False)
-    parser.add_argument("-last", "-l", nargs="+", default=None)
-    parser.add_argument("-ranks", action="store", type=check_ranks, default=None)
-    parser.add_argument("-eta", action="store_true", default=False)
-    parser.add_argument("-after", dest="after", nargs="+", default=None)
-    parser.add_argument("-before", dest="before", nargs="+", default=None)
-
-    res = parser.parse_args(args)
+    res = LEADERBOARD_PARSER.parse_args(args)
 
     return vars(res)
 
@@ -49,49 +35,17 @@ def parse_speed_args(args):
         'before': <datetime> | None,
         'after': <datetime> | None
     }"""
-    parser = MyParser(add_help=False)
-    parser.add_argument("usernames", type=str, nargs="*", default=[])
-    parser.add_argument("-canvas", "-c", action="store_true", default=True)
-    parser.add_argument("-alltime", "-at", action="store_true", default=False)
-
-    parser.add_argument(
-        "-groupby",
-        "-g",
-        choices=["canvas", "month", "week", "day", "hour"],
-        required=False,
-    )
-    parser.add_argument("-progress", "-p", action="store_true", default=False)
-
-    parser.add_argument("-last", "-l", nargs="+", default=None)
-    parser.add_argument("-after", dest="after", nargs="+", default=None)
-    parser.add_argument("-before", dest="before", nargs="+", default=None)
-
-    res = parser.parse_args(args)
+    res = SPEED_PARSER.parse_args(args)
     return vars(res)
 
 
 def parse_outline_args(args):
-    parser = MyParser(add_help=False)
-
-    parser.add_argument("pos_args", type=str, nargs="*")
-    parser.add_argument("-sparse", "-thin", action="store_true", default=False)
-    parser.add_argument("-width", metavar="<number>", action="store", type=int, default=1)
-
-    res = parser.parse_args(args)
+    res = OUTLINE_PARSER.parse_args(args)
     return vars(res)
 
 
 def parse_pixelfont_args(args):
-    parser = MyParser(add_help=False)
-    parser.add_argument("text", type=str, nargs="*")
-
-    parser.add_argument("-font", type=str, action="store", required=False, default="*")
-    parser.add_argument("-color", type=str, nargs="*", action="store", required=False)
-    parser.add_argument(
-        "-bgcolor", "-bg", nargs="*", type=str, action="store", required=False
-    )
-
-    return parser.parse_args(args)
+    return PIXELFONT_PARSER.parse_args(args)
 
 
 def valid_datetime_type(arg_datetime_str, user_timezone: timezone = None):
@@ -156,3 +110,54 @@ def check_ranks(value):
         raise argparse.ArgumentTypeError("The rank range must be less than 40.")
 
     return (rank_low, rank_high)
+
+
+# the parsers are built once and reused, parse_args() doesn't change their state
+# (the positional lists have no default so each call gets a new empty list)
+LEADERBOARD_PARSER = MyParser(add_help=False)
+LEADERBOARD_PARSER.add_argument("names", type=str, nargs="*")
+LEADERBOARD_PARSER.add_argument("-canvas", "-c", action="store_true", default=False)
+LEADERBOARD_PARSER.add_argument(
+    "-lines", metavar="<number>", action="store", type=check_lines, default=15
+)
+LEADERBOARD_PARSER.add_argument("-graph", "-g", action="store_true", default=False)
+LEADERBOARD_PARSER.add_argument("-bars", "-b", action="store_true", default=False)
+LEADERBOARD_PARSER.add_argument("-last", "-l", nargs="+", default=None)
+LEADERBOARD_PARSER.add_argument("-ranks", action="store", type=check_ranks, default=None)
+LEADERBOARD_PARSER.add_argument("-eta", action="store_true", default=False)
+LEADERBOARD_PARSER.add_argument("-after", dest="after", nargs="+", default=None)
+LEADERBOARD_PARSER.add_argument("-before", dest="before", nargs="+", default=None)
+
+SPEED_PARSER = MyParser(add_help=False)
+SPEED_PARSER.add_argument("usernames", type=str, nargs="*")
+SPEED_PARSER.add_argument("-canvas", "-c", action="store_true", default=True)
+SPEED_PARSER.add_argument("-alltime", "-at", action="store_true", default=False)
+SPEED_PARSER.add_argument(
+    "-groupby",
+    "-g",
+    choices=["canvas", "month", "week", "day", "hour"],
+    required=False,
+)
+SPEED_PARSER.add_argument("-progress", "-p", action="store_true", default=False)
+SPEED_PARSER.add_argument("-last", "-l", nargs="+", default=None)
+SPEED_PARSER.add_argument("-after", dest="after", nargs="+", default=None)
+SPEED_PARSER.add_argument("-before", dest="before", nargs="+", default=None)
+
+OUTLINE_PARSER = MyParser(add_help=False)
+OUTLINE_PARSER.add_argument("pos_args", type=str, nargs="*")
+OUTLINE_PARSER.add_argument("-sparse", "-thin", action="store_true", default=False)
+OUTLINE_PARSER.add_argument(
+    "-width", metavar="<number>", action="store", type=int, default=1
+)
+
+PIXELFONT_PARSER = MyParser(add_help=False)
+PIXELFONT_PARSER.add_argument("text", type=str, nargs="*")
+PIXELFONT_PARSER.add_argument(
+    "-font", type=str, action="store", required=False, default="*"
+)
+PIXELFONT_PARSER.add_argument(
+    "-color", type=str, nargs="*", action="store", required=False
+)
+PIXELFONT_PARSER.add_argument(
+    "-bgcolor", "-bg", nargs="*", type=str, action="store", required=False
+)
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import os
 import re
 from dataclasses import dataclass
@@ -48,15 +49,16 @@ def format_table(table, column_names, alignments=None, name=None, autoformat=Fal
     if autoformat:
         table = [[format_number(c) for c in row] for row in table]
 
-    # find the longest columns
-    table = table.copy()
-    table.insert(0, column_names)
-    longest_cols = [
-        (max([len(str(row[i])) for row in table])) for i in range(len(table[0]))
-    ]
+    # find the longest columns in a single pass
+    longest_cols = [len(str(c)) for c in column_names]
+    for row in table:
+        for i, value in enumerate(row):
+            length = len(str(value))
+            if length > longest_cols[i]:
+                longest_cols[i] = length
 
     # format the header
-    LINE = "-" * (sum(longest_cols) + len(table[0] * 3))
+    LINE = "-" * (sum(longest_cols) + len(column_names * 3))
     if alignments:
         row_format = " | ".join(
             [
@@ -74,22 +76,18 @@ def format_table(table, column_names, alignments=None, name=None, autoformat=Fal
             ["{:>" + str(longest_col) + "}" for longest_col in longest_cols]
         )
 
-    str_table = f"{LINE}\n"
-    str_table += "  " if name else " "
-    str_table += f"{title_format.format(*table[0])}\n{LINE}\n"
+    lines = [LINE, ("  " if name else " ") + title_format.format(*column_names), LINE]
 
     # format the body
-    for row in table[1:]:
+    for row in table:
         # replace None values with an empty string
         row = ["" if r is None else str(r) for r in row]
         if name:
-            str_table += (
-                ("+ " if row[1] == name else "  ") + row_format.format(*row) + "\n"
-            )
+            lines.append(("+ " if row[1] == name else "  ") + row_format.format(*row))
         else:
-            str_table += " " + row_format.format(*row) + "\n"
+            lines.append(" " + row_format.format(*row))
 
-    return str_table
+    return "\n".join(lines) + "\n"
 
 
 def format_number(num):
@@ -99,7 +97,7 @@ def format_number(num):
     >>> format_number(None) -> '???'
     >>> format_number('not a number') -> 'not a number'"""
     if isinstance(num, int):
-        return f"{int(num):,}".replace(",", " ")  # convert to string
+        return _format_int(num)
     elif isinstance(num, float):
         return f"{round(float(num),2):,}".replace(",", " ")  # convert to string
     elif num is None:
@@ -108,8 +106,13 @@ def format_number(num):
         return str(num)
 
 
+@functools.lru_cache(maxsize=1024)
+def _format_int(num: int) -> str:
+    return f"{int(num):,}".replace(",", " ")  # convert to string
+
+
 EMOJI_REGEX = r"<(?P<animated>a?):(?P<name>[a-zA-Z0-9_]{2,32}):(?P<id>[0-9]{18,22})>"
-IMAGE_URL_REGEX = r"(?:http\:|https\:)?\/\/.*\.(?:png|jpg|jpeg|gif|webp)"
+IMAGE_URL_REGEX = re.compile(r"(?:http\:|https\:)?\/\/.*\.(?:png|jpg|jpeg|gif|webp)")
 URL_REGEX = (
     r"http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
 )
@@ -246,12 +249,21 @@ async def get_image(
         except Exception as e:
             raise ValueError(e)
         if return_type in ["image", "image_RGBA"]:
-            res_image = Image.open(BytesIO(res_image))
-            if return_type == "image_RGBA":
-                res_image = res_image.convert("RGBA")
+            res_image = await bytes_to_image(res_image, return_type == "image_RGBA")
     return res_image, url
 
 
+@in_executor()
+def bytes_to_image(image_bytes: bytes, convert_rgba=True) -> Image.Image:
+    """Decode image bytes to a pillow Image (converted to RGBA if `convert_rgba`
+    is True) without blocking the event loop"""
+    image = Image.open(BytesIO(image_bytes))
+    if convert_rgba and image.mode != "RGBA":
+        return image.convert("RGBA")
+    image.load()
+    return image
+
+
 def get_url(content, accept_emojis=True, accept_templates=True):
     """Get the URL from a content that can be:
     - a string URL
@@ -266,7 +278,7 @@ def get_url(content, accept_emojis=True, accept_templates=True):
         return dict(url=content, type="template")
 
     # image URL
-    urls = re.findall(IMAGE_URL_REGEX, content)
+    urls = IMAGE_URL_REGEX.findall(content)
     if len(urls) > 0:
         url = urls[0]
         return dict(url=url, type="image_url")
@@ -297,10 +309,17 @@ def image_to_file(
     image: Image.Image, filename: str, embed: disnake.Embed = None
 ) -> disnake.File:
     """Convert a pillow Image to a discord File
-    attach the file to a discord embed if one is given"""
+    attach the file to a discord embed if one is given
+
+    The image is encoded as lossless WebP if the filename ends with `.webp`
+    (faster and smaller for big images), as PNG otherwise"""
 
     with BytesIO() as image_binary:
-        image.save(image_binary, "PNG")
+        if filename.lower().endswith(".webp"):
+            image.save(image_binary, "WEBP", lossless=True, quality=0, method=0)
+        else:
+            # fast compression: the encoding time matters more than the file size here
+            image.save(image_binary, "PNG", compress_level=1)
         image_binary.seek(0)
         image = disnake.File(image_binary, filename=filename)
         if embed:
@@ -308,6 +327,15 @@ def image_to_file(
         return image
 
 
+@in_executor()
+def image_to_bytes(image: Image.Image) -> bytes:
+    """Encode a pillow Image as PNG bytes, useful to send the same image
+    multiple times without encoding it again"""
+    with BytesIO() as image_binary:
+        image.save(image_binary, "PNG")
+        return image_binary.getvalue()
+
+
 async def number_emoji(ctx):
     emojis = await ctx.guild.fetch_emojis()
     nb_static = 0
@@ -1,3 +1,4 @@
+import functools
 import json
 import os
 
@@ -37,46 +38,61 @@ letter_bases = {
     "ñ": "n",
     "Ñ": "N",
 }
+# map each accented character to its letter base
+accent_map = {
+    c: base for key, base in letter_bases.items() for c in key if c in all_accents
+}
 
 test_string = 'abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 ./-+*&~#’()|_^@[]{}%!?$€:,\\`><;"'
 
 
-def load_font_images():
-    """Load all the files needed for the fonts"""
-    font_files = {}
-    nb_fonts = len(os.listdir(fonts_folder))
-    nb_loaded_fonts = 0
-    for font_name in os.listdir(fonts_folder):
-        # load the font image
-        font_img_path = os.path.join(fonts_folder, font_name, font_name + ".png")
-        try:
-            font_img = Image.open(font_img_path)
-            if font_img.mode != "RGB":
-                raise ValueError("Unsupported image mode: " + font_img.mode)
-        except FileNotFoundError:
-            logger.warning(
-                f"Couldn't load font '{font_name}': {font_name}.png not found."
-            )
-            continue
-
-        # load the font json
-        font_json_path = os.path.join(fonts_folder, font_name, font_name + ".json")
-        try:
-            with open(font_json_path, "r") as json_file:
-                font_json = json.load(json_file)
-        except FileNotFoundError:
-            logger.warning(
-                f"Couldn't load font '{font_name}': {font_name}.json not found."
-            )
-            continue
-        nb_loaded_fonts += 1
-        font_files[font_name] = {"image": font_img, "json": font_json}
-
-    logger.debug(f"{nb_loaded_fonts}/{nb_fonts} Fonts loaded.")
-    return font_files
-
-
-font_files = load_font_images()
+def find_fonts():
+    """Find the fonts that have all the files needed, the files are only loaded
+    when the font is used"""
+    font_names = []
+    font_dirs = os.listdir(fonts_folder)
+    for font_name in font_dirs:
+        for extension in (".png", ".json"):
+            if not os.path.isfile(
+                os.path.join(fonts_folder, font_name, font_name + extension)
+            ):
+                logger.warning(
+                    f"Couldn't load font '{font_name}': {font_name}{extension} not found."
+                )
+                break
+        else:
+            font_names.append(font_name)
+
+    logger.debug(f"{len(font_names)}/{len(font_dirs)} Fonts found.")
+    return font_names
+
+
+font_names = find_fonts()
+
+
+@functools.lru_cache(maxsize=None)
+def get_font_files(font_name):
+    """Load the files needed for a font the first time it's used,
+    return None if the font doesn't exist"""
+    if font_name not in font_names:
+        return None
+
+    # load the font image
+    font_img_path = os.path.join(fonts_folder, font_name, font_name + ".png")
+    with Image.open(font_img_path) as font_img:
+        if font_img.mode != "RGB":
+            raise ValueError("Unsupported image mode: " + font_img.mode)
+        # convert the font image to RGBA pixels once, they're sliced for each character
+        font_img = font_img.convert("RGBA")
+    font_array = np.asarray(font_img)
+    font_array.setflags(write=False)
+
+    # load the font json
+    font_json_path = os.path.join(fonts_folder, font_name, font_name + ".json")
+    with open(font_json_path, "r") as json_file:
+        font_json = json.load(json_file)
+
+    return {"image": font_img, "json": font_json, "array": font_array}
 
 
 class FontNotFound(Exception):
@@ -91,11 +107,12 @@ class FontManager:
         self.font_name = font_name
         self.image = self.get_image()
         self.json = self.get_json()
+        self.charset = frozenset(self.json)
+        self.accent_table = _get_accent_table(self.font_name)
 
         self.image_background_color = self.json["background"]
         self.image_background_color = list(self.image_background_color)
         self.image_background_color.append(255)
-        self.image = self.image.convert("RGBA")
 
         self.max_width = self.json["width"]
         self.max_height = self.json["height"]
@@ -110,23 +127,29 @@ class FontManager:
     def set_font_color(self, font_color):
         if not font_color:
             self.font_color = None
+            self._font_color_key = None
             return
         font_color = list(font_color)
         if len(font_color) != 4:
             font_color.append(255)
         self.font_color = font_color
+        self._font_color_key = tuple(font_color)
 
     def set_background_color(self, background_color):
         if not background_color:
-            self.background_color = self.image_background_color
-            return
-        background_color = list(background_color)
-        if len(background_color) != 4:
-            background_color.append(255)
+            background_color = self.image_background_color
+        else:
+            background_color = list(background_color)
+            if len(background_color) != 4:
+                background_color.append(255)
         self.background_color = background_color
+        self._background_color_key = tuple(background_color)
+        # the background color packed as a uint32 to compare whole RGBA pixels
+        background_array = np.array(background_color, dtype=np.uint8)
+        self.packed_background_color = background_array.view("<u4")[0]
 
     def get_image(self):
-        files = font_files.get(self.font_name)
+        files = get_font_files(self.font_name)
         if files is None:
             raise FontNotFound(f"Font '{self.font_name}' was not found.")
         image = files.get("image")
@@ -135,7 +158,7 @@ class FontManager:
         return image
 
     def get_json(self):
-        files = font_files.get(self.font_name)
+        files = get_font_files(self.font_name)
         if files is None:
             raise FontNotFound(f"Font '{self.font_name}' was not found.")
         json = files.get("json")
@@ -144,39 +167,63 @@ class FontManager:
         return json
 
     def char_exists(self, char):
-        try:
-            self.json[char]
-            return True
-        except KeyError:
-            return None
+        return char in self.charset or None
 
     def get_char_array(self, char):
-        """return a numpy array of the character pixels
+        """return a read-only numpy array of the character pixels
         or None if the character isn't in the font"""
-        try:
-            char_coords = self.json[char]
-        except KeyError:
+        if char not in self.charset:
             return None
 
-        x0 = char_coords[0]
-        y0 = char_coords[1]
-        max_x = char_coords[2]
-        max_y = char_coords[3]
+        return _get_char_array(
+            self.font_name, char, self._font_color_key, self._background_color_key
+        )
 
-        array = np.zeros((self.max_height, max_x, 4), dtype=np.uint8)
-        array[:, :] = self.background_color
-        for y in range(max_y):
-            for x in range(max_x):
-                pixel_color = self.image.getpixel((x0 + x, y0 + y))
-                if list(pixel_color) != self.image_background_color:
-                    if self.font_color:
-                        array[y, x] = list(self.font_color)
-                    else:
-                        array[y, x] = list(pixel_color)
-                else:
-                    array[y, x] = list(self.background_color)
 
-        return array
+@functools.lru_cache(maxsize=None)
+def _get_accent_table(font_name):
+    """Get a `str.translate` table to replace the accented characters missing
+    in a font with their letter base"""
+    font_json = get_font_files(font_name)["json"]
+    return str.maketrans(
+        {c: base for c, base in accent_map.items() if c not in font_json}
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _get_char_pixels(font_name, char):
+    """Get the pixels of a character in a font and a mask of the pixels that
+    aren't the font background, the result is cached for each character"""
+    files = get_font_files(font_name)
+    font_json = files["json"]
+    x0, y0, max_x, max_y = font_json[char][:4]
+    font_array = files["array"]
+    background_color = list(font_json["background"]) + [255]
+
+    char_pixels = np.zeros((font_json["height"], max_x, 4), dtype=np.uint8)
+    char_pixels[:max_y] = font_array[y0 : y0 + max_y, x0 : x0 + max_x]
+    char_mask = np.zeros(char_pixels.shape[:2], dtype=bool)
+    char_mask[:max_y] = (char_pixels[:max_y] != background_color).any(axis=2)
+
+    char_pixels.setflags(write=False)
+    char_mask.setflags(write=False)
+    return char_pixels, char_mask
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_char_array(font_name, char, font_color, background_color):
+    """Get the read-only array of a character drawn with the given colors,
+    the result is cached for each character and colors"""
+    char_pixels, char_mask = _get_char_pixels(font_name, char)
+    array = np.empty(char_pixels.shape, dtype=np.uint8)
+    array[:, :] = background_color
+    if font_color:
+        array[char_mask] = font_color
+    else:
+        array[char_mask] = char_pixels[char_mask]
+
+    array.setflags(write=False)
+    return array
 
 
 class PixelText:
@@ -191,30 +238,42 @@ class PixelText:
         self.image_array = []
 
     def make_array(self, accept_empty=False):
-        """Change the self.array object to have the numpy array of the text
-        by concatenating numpy arrays of each characters"""
-        self.image_array = np.zeros((self.font.max_height, 1, 4), dtype=np.uint8)
-        self.image_array[:, :] = self.background_color or [255, 255, 255, 255]
-
+        """Change the self.array object to have the numpy array of the text,
+        the width of the text is computed first so each character array is
+        written in a single preallocated array"""
+        dot_width = self.font.max_width // 3
+        # list of (x position, character array or None for a dot)
+        segments = []
+        cursor = 1
         empty = True
-        for char in self.text:
+        # replace the missing accented characters in one pass over the text
+        for char in self.text.translate(self.font.accent_table):
             font_char = self.get_char(char)
             if font_char is not None:
                 empty = False
                 char_array = self.font.get_char_array(font_char)
-                self.image_array = np.concatenate((self.image_array, char_array), axis=1)
-                self.add_space()
+                segments.append((cursor, char_array))
+                cursor += char_array.shape[1] + 1
 
             elif char == " ":
-                self.add_space(SPACE_WIDTH)
+                cursor += SPACE_WIDTH
 
             elif char == "\t":
-                self.add_space(2 * 4)
+                cursor += 2 * 4
 
             elif char == ".":
                 empty = False
-                self.add_dot()
-                self.add_space()
+                segments.append((cursor, None))
+                cursor += dot_width + 1
+
+        self.image_array = np.empty((self.font.max_height, cursor, 4), dtype=np.uint8)
+        self.image_array[:, :] = self.background_color or [255, 255, 255, 255]
+        dot_color = self.font_color or [255, 255, 255, 255]
+        for x, char_array in segments:
+            if char_array is None:
+                self.image_array[-dot_width:, x : x + dot_width] = dot_color
+            else:
+                self.image_array[:, x : x + char_array.shape[1]] = char_array
 
         if empty and not accept_empty:
             return None
@@ -226,76 +285,53 @@ class PixelText:
         the image is made by converting the generated numpy array to PIL Image"""
         if self.make_array() is None:
             return None
-        # remove excessive space around chars
-        while (self.image_array[0, :] == self.background_color).all():
-            self.image_array = np.delete(self.image_array, 0, 0)
-        while (self.image_array[-1, :] == self.background_color).all():
-            self.image_array = np.delete(self.image_array, -1, 0)
-
-        # add an outline at the top and bottom
-        if not (self.image_array[0, :] == self.background_color).all():
-            self.add_top_line()
-
-        if not (self.image_array[-1, :] == self.background_color).all():
-            self.add_bottom_line()
+        # remove excessive space around chars and keep a 1 pixel outline at the top and bottom
+        # compare whole pixels packed as uint32 instead of each RGBA channel
+        packed_array = self.image_array.view("<u4")[:, :, 0]
+        text_rows = np.flatnonzero(
+            (packed_array != self.font.packed_background_color).any(axis=1)
+        )
+        if len(text_rows) == 0:
+            return None
+        top, bottom = text_rows[0], text_rows[-1] + 1
+        image_array = np.empty(
+            (bottom - top + 2, self.image_array.shape[1], 4), dtype=np.uint8
+        )
+        image_array[:, :] = self.background_color
+        image_array[1:-1] = self.image_array[top:bottom]
+        self.image_array = image_array
 
         im = Image.fromarray(self.image_array)
         return im
 
-    def get_char(self, char, from_case=False):
-
+    def get_char(self, char):
+        """Get the character to draw for the given character: the character itself,
+        its letter base if it has an accent, or else the other case of either of them"""
         if char is None:
             return None
+        charset = self.font.charset
         # if the char is valid, we return it
-        res = self.font.char_exists(char)
-        if res:
+        if char in charset:
             return char
 
         # check on accent
-        if char in all_accents:
-            for key in letter_bases:
-                if char in key:
-                    letter_base = letter_bases[key]
-                    return self.get_char(letter_base)
+        char = accent_map.get(char, char)
+        if char in charset:
+            return char
 
         # check on case
-        if not from_case:  # to avoid infinite recursion
-            if char.isupper():
-                return self.get_char(char.lower(), True)
-            if char.islower():
-                return self.get_char(char.upper(), True)
+        if char.isupper():
+            char = char.lower()
+        elif char.islower():
+            char = char.upper()
         else:
             return None
-
-    def add_space(self, width=1):
-        space = np.zeros((self.font.max_height, 1, 4), dtype=np.uint8)
-        space[:, :] = self.background_color
-        for i in range(width):
-            self.image_array = np.concatenate((self.image_array, space), axis=1)
-
-    def add_bottom_line(self):
-        space = np.zeros((1, self.image_array.shape[1], 4), dtype=np.uint8)
-        space[:, :] = self.background_color
-        self.image_array = np.concatenate((self.image_array, space), axis=0)
-
-    def add_top_line(self):
-        space = np.zeros((1, self.image_array.shape[1], 4), dtype=np.uint8)
-        space[:, :] = self.background_color
-        self.image_array = np.concatenate((space, self.image_array), axis=0)
-
-    def add_dot(self):
-        dot_array = np.zeros(
-            (self.font.max_height, self.font.max_width // 3, 4), dtype=np.uint8
-        )
-        dot_array[:, :] = self.background_color
-        for i in range(1, (self.font.max_width // 3) + 1):
-            dot_array[-i, :] = self.font_color or [255, 255, 255, 255]
-        self.image_array = np.concatenate((self.image_array, dot_array), axis=1)
+        return char if char in charset else None
 
 
 def get_all_fonts():
     """Return a list with all the available fonts"""
-    return list(font_files.keys())
+    return list(font_names)
 
 
 def get_allowed_fonts():
@@ -1,5 +1,8 @@
 import colorsys
+import functools
+import hashlib
 import re
+import threading
 from typing import Union
 
 import matplotlib.colors as mc
@@ -127,22 +130,34 @@ def add_outline(original_image, color, full=True, outline_width=1, crop=True):
 
 def remove_white_space(original_image):
     """Remove the extra transparent pixels around a PNG image"""
-    image = original_image.convert("RGBA")
-    image_array = np.array(image)
-    mask = image_array[:, :, 3] > 128
-    r = mask.any(1)
-    if r.any():
-        m, n = mask.shape
-        c = mask.any(0)
-        out = image_array[
-            r.argmax() : m - r[::-1].argmax(), c.argmax() : n - c[::-1].argmax()
-        ]
+    if original_image.mode == "RGBA":
+        image = original_image
     else:
+        image = original_image.convert("RGBA")
+    # nothing to remove if all the pixels are visible
+    if image.getchannel("A").getextrema()[0] > 128:
+        return image
+    out = crop_white_space(np.asarray(image))
+    if out.size == 0:
         out = np.empty((0, 0), dtype=bool)
 
     return Image.fromarray(out)
 
 
+def crop_white_space(image_array: np.ndarray) -> np.ndarray:
+    """Remove the extra transparent pixels around a RGBA image array,
+    the result is a view of the input array"""
+    mask = image_array[:, :, 3] > 128
+    r = mask.any(1)
+    if not r.any():
+        return image_array[:0, :0]
+    m, n = mask.shape
+    c = mask.any(0)
+    return image_array[
+        r.argmax() : m - r[::-1].argmax(), c.argmax() : n - c[::-1].argmax()
+    ]
+
+
 def highlight_image(
     top_array: np.ndarray,
     background_array: np.ndarray,
@@ -164,11 +179,18 @@ def highlight_image(
             (background_array, np.zeros(background_array.shape[:-1]))
         )
 
-    black_background = np.zeros_like(background_array)
+    # (every pixel is written, no need to zero the array first)
+    black_background = np.empty_like(background_array)
     black_background[:, :] = background_color
     black_background[:, :, 3] = background_array[:, :, 3]
 
-    background_array[:, :, -1] = opacity * background_array[:, :, -1]
+    # scale the alpha in place, without a float64 copy of the channel
+    np.multiply(
+        background_array[:, :, -1],
+        opacity,
+        out=background_array[:, :, -1],
+        casting="unsafe",
+    )
 
     black_background_img = Image.fromarray(black_background)
     background_img = Image.fromarray(background_array)
@@ -218,6 +240,12 @@ def rgb_to_hex(rgb):
     return (str % rgb).upper()
 
 
+def rgbs_to_hex(rgbs) -> list:
+    """convert an array of RGB/RGBA colors (shape (n, 3|4)) to a list of hex codes
+    ([[255,255,255]] -> ['#FFFFFF'])"""
+    return [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in np.asarray(rgbs)[:, :3].tolist()]
+
+
 def get_color(color: str, pxls_only=False, mode="RGBA"):
     """Get the name and RGBA value of a color
 
@@ -239,11 +267,19 @@ def get_color(color: str, pxls_only=False, mode="RGBA"):
 def rgb_to_pxls(rgb):
     """convert a RGB tuple to a pxlsColor.
     Return None if no color match."""
-    rgb = rgb[:3]
-    for pxls_color in stats.get_palette():
-        if rgb == hex_to_rgb(pxls_color["value"]):
-            return pxls_color["name"]
-    return None
+    return get_pxls_rgb_index().get(tuple(rgb[:3]))
+
+
+def get_pxls_rgb_index() -> dict:
+    """Get a dictionary of the current pxls palette where the key is the RGB
+    tuple and the value is the color name"""
+    return _get_pxls_rgb_index(stats.palette_version)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_pxls_rgb_index(palette_version):
+    # reversed so the first color is kept if 2 colors have the same RGB
+    return {hex_to_rgb(c["value"]): c["name"] for c in reversed(stats.get_palette())}
 
 
 def hex_to_rgb(hex: str, mode="RGB"):
@@ -302,49 +338,54 @@ def lighten_color(color, amount=0.5):
 
 
 # this is mostly copied from PxlsFiddle code
-@jit(nopython=True, cache=True)
+@jit(nopython=True, nogil=True, cache=True)
 def get_image_scale(image_array: np.ndarray) -> int:
     """return the scale for an upscaled image or None if not found"""
     min_pixel_width = int(1e6)
     min_pixel_height = int(1e6)
-    prev_x = 0
-    prev_y = 0
     height = image_array.shape[0]
     width = image_array.shape[1]
-    previous_color = image_array[0, 0]
+    nb_channels = image_array.shape[2]
+
+    # first pass: the smallest horizontal run of the same color
     for y in range(height):
-        for x in range(width):
-            color = image_array[y, x]
-            if x == 0:
-                previous_color = color.copy()
+        if min_pixel_width == 1:
+            break  # can't get any smaller
+        prev_x = 0
+        for x in range(1, width):
             # find the next pixel with a different color
-            elif (color != previous_color).any() and not (
-                color[-1] == 0 and previous_color[-1] == 0
-            ):  # to exclude transparent pixels
+            different = False
+            for c in range(nb_channels):
+                if image_array[y, x, c] != image_array[y, prev_x, c]:
+                    different = True
+                    break
+            # to exclude transparent pixels
+            if different and not (
+                image_array[y, x, -1] == 0 and image_array[y, prev_x, -1] == 0
+            ):
                 # check if the diff is smaller than the min
                 if (x - prev_x) < min_pixel_width:
-                    # print(f"x: {x} y: {y}, prev_x: {prev_x} run: {x - prev_x} vs {min_pixel_width}")
-                    # print(previous_color, color)
                     min_pixel_width = x - prev_x
-                previous_color = color.copy()
                 prev_x = x
-        prev_x = 0
 
+    # second pass: the smallest vertical run, the largest value of the 2 is used
+    # so we can stop as soon as it's not bigger than the horizontal one
     for x in range(width):
-        for y in range(height):
-            color = image_array[y, x]
-            if y == 0:
-                previous_color = color.copy()
-            elif (color != previous_color).any() and not (
-                color[-1] == 0 and previous_color[-1] == 0
+        if min_pixel_height <= min_pixel_width:
+            break
+        prev_y = 0
+        for y in range(1, height):
+            different = False
+            for c in range(nb_channels):
+                if image_array[y, x, c] != image_array[prev_y, x, c]:
+                    different = True
+                    break
+            if different and not (
+                image_array[y, x, -1] == 0 and image_array[prev_y, x, -1] == 0
             ):
                 if (y - prev_y) < min_pixel_height:
-                    # print(f"x: {x} y: {y}, prev_y: {prev_y} run: {y - prev_y} vs {min_pixel_height}")
-                    # print(previous_color, color)
                     min_pixel_height = y - prev_y
-                previous_color = color.copy()
                 prev_y = y
-        prev_y = 0
 
     # use the largest value, it's easier to tweak down than to tweak up.
     pixel_size = max(min_pixel_width, min_pixel_height)
@@ -355,17 +396,77 @@ def get_image_scale(image_array: np.ndarray) -> int:
         return None
 
 
+# cache of the scales found by get_image_scale, the key is a hash of the image
+_image_scale_cache = {}
+# the cache is used from executor threads
+_image_scale_cache_lock = threading.Lock()
+IMAGE_SCALE_CACHE_SIZE = 128
+
+
+def get_image_scale_cached(image_array: np.ndarray) -> int:
+    """Same as `get_image_scale()` but the result is cached for the images
+    already seen"""
+    image_array = np.ascontiguousarray(image_array)
+    key = (
+        image_array.shape,
+        image_array.dtype.str,
+        hashlib.blake2b(image_array.data, digest_size=16).digest(),
+    )
+    with _image_scale_cache_lock:
+        if key in _image_scale_cache:
+            return _image_scale_cache[key]
+    scale = get_image_scale(image_array)
+    with _image_scale_cache_lock:
+        if len(_image_scale_cache) >= IMAGE_SCALE_CACHE_SIZE:
+            # remove the oldest entry
+            _image_scale_cache.pop(next(iter(_image_scale_cache)), None)
+        _image_scale_cache[key] = scale
+    return scale
+
+
 def get_visible_pixels(image: Union[Image.Image, np.ndarray]) -> int:
     """Get the amount of visible pixels in an image"""
-    image = np.array(image)
-    nb_channels = image.shape[-1]
-    if nb_channels == 1:
-        return int(np.sum(image != 255))
-    elif nb_channels == 3:
+    if isinstance(image, Image.Image):
+        if "A" not in image.getbands():
+            return image.width * image.height
+        alpha = np.asarray(image.getchannel("A"))
+        return int(np.count_nonzero(alpha > 128))
+
+    image = np.asarray(image)
+    if image.ndim == 2 or image.shape[-1] == 1:
+        # array of palette indexes
+        return int(np.count_nonzero(image != 255))
+    elif image.shape[-1] == 3:
         return image.shape[0] * image.shape[1]
     else:
-        alpha_mask = image[:, :, 3] > 128
-        return int(np.sum(alpha_mask))
+        return int(np.count_nonzero(image[:, :, 3] > 128))
+
+
+def get_visible_colors(image: Image.Image) -> list:
+    """Get the visible colors of an image (alpha > 128) with their amount.
+
+    Return a list of `(amount, (r, g, b))` like `Image.getcolors()`"""
+    image_array = np.asarray(image.convert("RGBA"))
+    visible_pixels = image_array[image_array[:, :, 3] > 128]
+    # pack the RGB values in a single int to count them all at once
+    rgb = visible_pixels[:, :3].astype(np.uint32)
+    packed = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    values, counts = np.unique(packed, return_counts=True)
+    return [
+        (int(count), (int(value >> 16), int((value >> 8) & 0xFF), int(value & 0xFF)))
+        for value, count in zip(values, counts)
+    ]
+
+
+def count_visible_colors(image: Image.Image) -> int:
+    """Count the distinct RGBA colors of the visible pixels (alpha > 128)"""
+    if image.mode != "RGBA":
+        image = image.convert("RGBA")
+    image_array = np.asarray(image)
+    visible_pixels = image_array[image_array[:, :, 3] > 128]
+    # view each RGBA pixel as a single uint32 to sort them all at once
+    packed = np.ascontiguousarray(visible_pixels).view(np.uint32)
+    return len(np.unique(packed))
 
 
 def find_upscale(image: Image.Image, target=250000, max_scale=10):
@@ -621,6 +722,16 @@ def get_builtin_palette(palette_name: str, as_rgba=True):
 
 def get_colors_from_input(palette, accept_colors=True, accept_palettes=False):
     """Get a list of rgba, hex, and names from a list of color separated by commas"""
+    rgba_palette, hex_palette, palette_names = _parse_colors_input(
+        palette, accept_colors, accept_palettes, stats.palette_version
+    )
+    return rgba_palette.copy(), list(hex_palette), list(palette_names)
+
+
+# the palette version is part of the cache key because the input can depend on
+# the current pxls palette
+@functools.lru_cache(maxsize=128)
+def _parse_colors_input(palette, accept_colors, accept_palettes, palette_version):
     # format the colors
     palette = palette.lower()
     palette_input = palette.split(",")
@@ -682,7 +793,7 @@ def get_colors_from_input(palette, accept_colors=True, accept_palettes=False):
     if len(rgba_list) == 0:
         raise ValueError("This palette is empty.")
     # format the data
-    hex_palette = [rgb_to_hex(rgba[:3]) for rgba in rgba_list]
     rgba_palette = np.array(rgba_list)
+    hex_palette = rgbs_to_hex(rgba_palette)
 
-    return rgba_palette, hex_palette, palette_names
+    return rgba_palette, tuple(hex_palette), tuple(palette_names)
@@ -83,10 +83,10 @@ class Imgur:
         - Raises `ValueError` if the image is bigger than 5MB"""
         if isinstance(image, Image.Image):
             payload_image = await self.image_to_bytes(image)
-            if len(payload_image) > IMGUR_SIZE_LIMIT:
-                raise ValueError("This image is too big to be uploaded on imgur.")
         else:
             payload_image = image
+        if len(payload_image) > IMGUR_SIZE_LIMIT:
+            raise ValueError("This image is too big to be uploaded on imgur.")
         payload = {
             "image": payload_image,
         }
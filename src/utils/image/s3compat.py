@@ -27,10 +27,10 @@ class S3Compat:
         """Upload the input image to S3-compatible storage, return the image URL."""
         if isinstance(image, Image.Image):
             payload_image = await self.image_to_bytes(image)
-            if len(payload_image) > SIZE_LIMIT:
-                raise ValueError("This image is too big to be uploaded.")
         else:
             payload_image = image
+        if len(payload_image) > SIZE_LIMIT:
+            raise ValueError("This image is too big to be uploaded.")
 
         # Generate hash from image content
         image_hash = hashlib.sha256(payload_image).hexdigest()[:16]  # Adjust the length as needed
@@ -1,17 +1,37 @@
+import functools
+import re
 from io import BytesIO
-from itertools import cycle
 
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from matplotlib import cm as cm
 from matplotlib.colors import LinearSegmentedColormap
 from PIL import Image
 
-from utils.image.image_utils import hex_to_rgb, is_dark, lighten_color, rgb_to_hex
+from utils.image.image_utils import (
+    hex_to_rgb,
+    is_dark,
+    lighten_color,
+    rgb_to_hex,
+    rgbs_to_hex,
+)
 from utils.utils import in_executor
 
 """ Themes and util functions for the plotly plots """
 
+# matches plotly color strings: 'rgb(r, g, b)' or 'rgba(r, g, b, a)'
+_RGB_STRING_REGEX = re.compile(
+    r"rgba?\(\s*(\d+)\s*,\s*(\d+)\s*,\s*(\d+)\s*(?:,\s*[\d.]+\s*)?\)"
+)
+
+
+def rgb_string_to_hex(rgb_string: str) -> str:
+    """'rgb(255, 255, 255)' or 'rgba(255, 255, 255, a)' -> '#FFFFFF'"""
+    match = _RGB_STRING_REGEX.match(rgb_string)
+    return rgb_to_hex((int(match[1]), int(match[2]), int(match[3])))
+
 
 def add_glow(
     fig: go.Figure,
@@ -28,18 +48,16 @@ def add_glow(
     """
     alpha_value = alpha_lines / nb_glow_lines
 
+    # the traces are all added at the end so plotly validates them in one batch
+    new_traces = []
     for trace in fig.select_traces():
         x = trace.x
         y = trace.y
         mode = trace.mode
         line_width = trace.line.width
         line_color = trace.marker.color
-        if line_color.startswith("rgba"):
-            rgba = eval(line_color[4:])
-            rgb = rgba[:-1]
-            line_color = rgb_to_hex(rgb)
-        elif line_color.startswith("rgb"):
-            line_color = rgb_to_hex(eval(line_color[3:]))
+        if line_color.startswith("rgb"):
+            line_color = rgb_string_to_hex(line_color)
 
         # skip the color if dark_only is true and the color is not dark
         if dark_only and not is_dark(hex_to_rgb(line_color)):
@@ -58,19 +76,20 @@ def add_glow(
             color = glow_color
 
         # add the glow
+        glow_rgba = hex_to_rgba_string(color, alpha_value)
         for n in range(nb_glow_lines):
-            fig.add_trace(
+            new_traces.append(
                 go.Scatter(
                     x=x,
                     y=y,
                     mode=mode,
                     line=dict(width=line_width + (diff_linewidth * n)),
-                    marker=dict(color=hex_to_rgba_string(color, alpha_value)),
+                    marker=dict(color=glow_rgba),
                 )
             )
 
         # add the original trace over the glow
-        fig.add_trace(
+        new_traces.append(
             go.Scatter(
                 x=x,
                 y=y,
@@ -80,87 +99,127 @@ def add_glow(
             )
         )
 
+    fig.add_traces(new_traces)
+
 
 def hex_to_rgba_string(hex: str, alpha_value=1) -> str:
     """'#ffffff' -> 'rgba(255,255,255,alpha_value)'"""
     hex = hex.strip("#")
 
-    rgb = tuple([int(hex[i : i + 2], 16) for i in range(0, len(hex), 2)])
-    rgba = rgb + (alpha_value,)
+    rgba = tuple(bytes.fromhex(hex)) + (alpha_value,)
 
     return "rgba" + str(rgba)
 
 
+# plotly keeps a single kaleido scope whose chromium process stays alive between
+# renders, the figures are sent to it directly to skip the `write_image` checks.
+# MathJax isn't used in the plots so it's not loaded when the process starts.
+_kaleido_scope = pio.kaleido.scope
+_kaleido_scope.mathjax = None
+
+
 @in_executor()
 def fig2img(fig, width=2000, height=900, scale=1):
-    buf = BytesIO()
-    fig.write_image(buf, format="png", width=width, height=height, scale=scale)
-    img = Image.open(buf)
+    img_bytes = _kaleido_scope.transform(
+        fig, format="png", width=width, height=height, scale=scale
+    )
+    img = Image.open(BytesIO(img_bytes))
     return img
 
 
 def matplotlib_to_plotly(cmap_name, nb_colors):
-    """convert a matplotlib cmap to a list of colors in the format
-    'rgba(r,g,b,a)'"""
+    """convert a matplotlib cmap to a list of `nb_colors` hex colors"""
+    return list(_get_cmap_colors(cmap_name, nb_colors))
+
+
+@functools.lru_cache(maxsize=128)
+def _get_cmap_colors(cmap_name, nb_colors) -> tuple:
     cmap = cm.get_cmap(cmap_name)
-    cmap_rgba = []
-
-    if nb_colors <= 1:
-        rgba = cmap(0, bytes=True)
-        rgb = rgba[:-1]
-        hex = rgb_to_hex(rgb)
-        cmap_rgba.append(hex)
-    else:
-        for i in range(0, nb_colors):
-            rgba = cmap(i / (nb_colors - 1), bytes=True)
-            rgb = rgba[:-1]
-            hex = rgb_to_hex(rgb)
-            cmap_rgba.append(hex)
-    return cmap_rgba
+    return _sample_cmap(cmap, max(nb_colors, 1))
+
+
+def _sample_cmap(cmap, nb_colors) -> tuple:
+    """get `nb_colors` hex colors evenly spaced on a cmap in a single call to the cmap,
+    a single color is the start of the cmap"""
+    positions = np.arange(nb_colors) / max(nb_colors - 1, 1)
+    return tuple(rgbs_to_hex(cmap(positions, bytes=True)))
 
 
 def plotly_rgb_to_hex(plotly_palette):
     for i, c in enumerate(plotly_palette):
-        if c.startswith("rgba"):
-            rgba = eval(c[4:])
-            rgb = rgba[:-1]
-            plotly_palette[i] = rgb_to_hex(rgb)
-
-        elif c.startswith("rgb"):
-            plotly_palette[i] = rgb_to_hex(eval(c[3:]))
+        if c.startswith("rgb"):
+            plotly_palette[i] = rgb_string_to_hex(c)
     return plotly_palette
 
 
-def cycle_through_list(list, number_of_element: int):
-    """loop through a list the desired amount of time
+def cycle_through_list(items, number_of_element: int):
+    """loop through a list or tuple the desired amount of time, the result is a new list
     example: cycle_through_list([1,2,3],6) -> [1,2,3,1,2,3]"""
-    if len(list) == 0 or number_of_element == 0:
+    if len(items) == 0 or number_of_element == 0:
         return None
-    list = cycle(list)
-    res = []
-    count = 0
-    for i in list:
-        res.append(i)
-        count += 1
-        if count == number_of_element:
-            break
-    return res
+    nb_repeats = -(-number_of_element // len(items))
+    return (list(items) * nb_repeats)[:number_of_element]
 
 
 def get_gradient_palette(color_list, nb_colors):
     """Generate a gradient with the colors of `color_list`
     as a list of hex colors and a size of `nb_colors`"""
+    return list(_get_gradient_colors(tuple(color_list), nb_colors))
+
+
+@functools.lru_cache(maxsize=128)
+def _get_gradient_colors(color_tuple, nb_colors) -> tuple:
     cmap = LinearSegmentedColormap.from_list(
         name="speed",
-        colors=color_list,
+        colors=color_tuple,
     )
-    color_list = []
-    for i in range(nb_colors):
-        rgba = cmap(i / (nb_colors - 1), bytes=True)
-        rgb = rgba[:-1]
-        hex = rgb_to_hex(rgb)
-        color_list.append(hex)
-    return color_list
+    return _sample_cmap(cmap, nb_colors)
+
+
+_PXLS_PALETTE = (
+    "#88FFF3",
+    "#277E6C",
+    "#FDE817",
+    "#FFD5BC",
+    "#F02523",
+    "#BEFF40",
+    "#FFA9D9",
+    "#FFFFFF",
+    "#70DD13",
+    "#FFF491",
+    "#D24CE9",
+    "#32B69F",
+    "#31A117",
+    "#77431F",
+    "#B11206",
+    "#24B5FE",
+    "#888888",
+    "#FCA80E",
+    "#0B5F35",
+    "#FC7510",
+    "#740C00",
+    "#FFB783",
+    "#FF59EF",
+    "#CDCDCD",
+    "#FF6474",
+    "#B66D3D",
+    "#8B2FA8",
+    "#125CC7",
+)
+
+_DISCORD_PALETTE = (
+    "#5866ef",
+    "#3da560",
+    "#f37b68",
+    "#ec4145",
+    "#9b84ec",
+    "#f9a62b",
+    "#0cba99",
+    "#4f5d7e",
+    "#fe73f6",
+    "#583694",
+    "#09b0f2",
+)
 
 
 class Theme:
@@ -199,6 +258,21 @@ class Theme:
         self.table_outline_width = table_outline_width
         self.red_color = red_color
 
+        # layout properties shared by all the plots using this theme
+        self._base_layout = dict(
+            paper_bgcolor=self.background_color,
+            plot_bgcolor=self.background_color,
+            font_color=self.font_color,
+            font_size=35,
+            yaxis=dict(
+                showgrid=True,
+                gridwidth=1.5,
+                gridcolor=self.grid_color,
+                tickformat=",d",
+            ),
+            xaxis=dict(showgrid=True, gridwidth=1.5, gridcolor=self.grid_color),
+        )
+
     def get_palette(self, nb_colors):
         if self.palette == "synthwave":
             colors = matplotlib_to_plotly("cool", nb_colors)
@@ -215,53 +289,10 @@ class Theme:
             return cycle_through_list(colors, nb_colors)
 
         elif self.palette == "pxls":
-            colors = [
-                "#88FFF3",
-                "#277E6C",
-                "#FDE817",
-                "#FFD5BC",
-                "#F02523",
-                "#BEFF40",
-                "#FFA9D9",
-                "#FFFFFF",
-                "#70DD13",
-                "#FFF491",
-                "#D24CE9",
-                "#32B69F",
-                "#31A117",
-                "#77431F",
-                "#B11206",
-                "#24B5FE",
-                "#888888",
-                "#FCA80E",
-                "#0B5F35",
-                "#FC7510",
-                "#740C00",
-                "#FFB783",
-                "#FF59EF",
-                "#CDCDCD",
-                "#FF6474",
-                "#B66D3D",
-                "#8B2FA8",
-                "#125CC7",
-            ]
-            return cycle_through_list(colors, nb_colors)
+            return cycle_through_list(_PXLS_PALETTE, nb_colors)
 
         elif self.palette == "discord":
-            colors = [
-                "#5866ef",
-                "#3da560",
-                "#f37b68",
-                "#ec4145",
-                "#9b84ec",
-                "#f9a62b",
-                "#0cba99",
-                "#4f5d7e",
-                "#fe73f6",
-                "#583694",
-                "#09b0f2",
-            ]
-            return cycle_through_list(colors, nb_colors)
+            return cycle_through_list(_DISCORD_PALETTE, nb_colors)
 
         # default palette
         else:
@@ -272,56 +303,26 @@ class Theme:
     def get_layout(self, with_annotation=True, annotation_text=None):
         if not annotation_text:
             annotation_text = "Timezone: UTC"
+        layout = dict(self._base_layout)
         if with_annotation:
-            layout = go.Layout(
-                paper_bgcolor=self.background_color,
-                plot_bgcolor=self.background_color,
-                font_color=self.font_color,
-                font_size=35,
-                yaxis=dict(
-                    showgrid=True,
-                    gridwidth=1.5,
-                    gridcolor=self.grid_color,
-                    tickformat=",d",
-                ),
-                xaxis=dict(showgrid=True, gridwidth=1.5, gridcolor=self.grid_color),
-                margin=dict(b=150),
-                annotations=[
-                    go.layout.Annotation(
-                        x=1,
-                        y=-0.1,
-                        text=annotation_text,
-                        showarrow=False,
-                        xref="paper",
-                        yref="paper",
-                        xanchor="right",
-                        yanchor="auto",
-                        xshift=0,
-                        yshift=-80,
-                        font=dict(color=self.off_color),
-                    )
-                ],
-            )
-        else:
-            layout = go.Layout(
-                paper_bgcolor=self.background_color,
-                plot_bgcolor=self.background_color,
-                font_color=self.font_color,
-                font_size=35,
-                yaxis=dict(
-                    showgrid=True,
-                    gridwidth=1.5,
-                    gridcolor=self.grid_color,
-                    tickformat=",d",
-                ),
-                xaxis=dict(
-                    showgrid=True,
-                    gridwidth=1.5,
-                    gridcolor=self.grid_color,
-                ),
-            )
+            layout["margin"] = dict(b=150)
+            layout["annotations"] = [
+                go.layout.Annotation(
+                    x=1,
+                    y=-0.1,
+                    text=annotation_text,
+                    showarrow=False,
+                    xref="paper",
+                    yref="paper",
+                    xanchor="right",
+                    yanchor="auto",
+                    xshift=0,
+                    yshift=-80,
+                    font=dict(color=self.off_color),
+                )
+            ]
 
-        return layout
+        return go.Layout(**layout)
 
 
 default_theme = Theme(
@@ -1,9 +1,11 @@
 import math
+import time
 import uuid
 from datetime import datetime
 
 import numpy as np
 import pytz
+from numba import jit, prange
 from PIL import ImageColor
 
 from utils.log import get_logger
@@ -11,6 +13,11 @@ from utils.utils import get_content
 
 logger = get_logger(__name__)
 
+# how long the canvas code found in the database is kept (in seconds)
+DB_CANVAS_CODE_TTL = 60
+# max number of board changes kept before starting a new list
+MAX_BOARD_CHANGES = 100_000
+
 
 class PxlsStatsManager:
     """A helper to get data from pxls.space/stats"""
@@ -28,6 +35,22 @@ class PxlsStatsManager:
         self.placemap_array = None
         self.palette = None
 
+        # incremented every time the palette changes
+        self.palette_version = 0
+        # cache of the palette without the restricted colors as (palette_version, palette)
+        self._usable_palette = (None, None)
+        # incremented every time the board or palette change
+        self.board_version = 0
+        # flat indexes of the board pixels changed since the list was created,
+        # a new list is made when the board is replaced or the list is too long
+        self.board_changes = []
+        # cache of the palettized board as (board_version, array)
+        self._palettized_board = (None, None)
+        # cache of the palette lookup table as (palette_version, lut)
+        self._palette_lut = (None, None)
+        # cache of the last canvas code in the database as (expiry, canvas_code)
+        self._db_canvas_code = (0, None)
+
     async def refresh(self):
 
         status = False
@@ -104,6 +127,9 @@ class PxlsStatsManager:
         if restricted:
             return self.palette
         else:
+            version, palette = self._usable_palette
+            if version == self.palette_version:
+                return palette
             # get the palette without the restricted colors
             palette = []
             for color in self.palette:
@@ -115,10 +141,13 @@ class PxlsStatsManager:
                         palette.append(color)
                 else:
                     palette.append(color)
+            self._usable_palette = (self.palette_version, palette)
             return palette
 
     async def update_palette(self):
+        old_palette = self.palette
         self.palette = None
+        self.board_version += 1
         try:
             self.palette = self.board_info["palette"]
         except Exception:
@@ -130,6 +159,8 @@ class PxlsStatsManager:
             # couldn't get the palette from the board info or stats info
             # so we get the last palette saved in the database
             self.palette = await self.get_db_palette()
+        if self.palette != old_palette:
+            self.palette_version += 1
         return self.palette
 
     async def get_db_palette(self):
@@ -160,10 +191,17 @@ class PxlsStatsManager:
                 pass
         if canvas_code is None:
             # Use the last canvas code saved in the database
-            rows = await self.db_conn.sql_select(
-                "SELECT canvas_code, MAX(datetime) FROM record"
-            )
-            canvas_code = rows[0][0]
+            # (cached for a short time since it only changes with new records)
+            expiry, canvas_code = self._db_canvas_code
+            if time.monotonic() >= expiry:
+                rows = await self.db_conn.sql_select(
+                    "SELECT canvas_code, MAX(datetime) FROM record"
+                )
+                canvas_code = rows[0][0]
+                self._db_canvas_code = (
+                    time.monotonic() + DB_CANVAS_CODE_TTL,
+                    canvas_code,
+                )
         return canvas_code
 
     async def fetch_online_count(self):
@@ -172,9 +210,10 @@ class PxlsStatsManager:
         self.online_count = count
         return count
 
-    async def update_online_count(self, count):
+    async def update_online_count(self, count, canvas_code=None):
         """update the online count in the database"""
-        canvas_code = await self.get_canvas_code()
+        if canvas_code is None:
+            canvas_code = await self.get_canvas_code()
         dt = datetime.utcnow().replace(microsecond=0)
         sql = """INSERT INTO pxls_general_stat(stat_name, value ,canvas_code, datetime)
                 VALUES(?,?,?,?)"""
@@ -182,19 +221,65 @@ class PxlsStatsManager:
 
     def palettize_array(self, array, palette=None):
         """Convert a numpy array of palette indexes to a color numpy array
-        (RGBA). If a palette is given, it will be used to map the array, if not
-        the current pxls palette will be used"""
-        colors_list = []
-        if not palette:
+        (RGBA). If a palette is given (list of hex colors or array of RGBA colors),
+        it will be used to map the array, if not the current pxls palette will be used"""
+        if palette is None or len(palette) == 0:
+            lut = self.get_palette_lut()
+        else:
+            lut = self.make_palette_lut(palette)
+        return lut[array]
+
+    def count_colors(self, array) -> list:
+        """Count the visible colors in a numpy array of palette indexes.
+
+        Return a list of `(amount, (r, g, b))` like `get_visible_colors()` but
+        without palettizing the array first"""
+        lut = self.get_palette_lut()
+        counts = np.bincount(array.ravel(), minlength=256)
+        return [
+            (int(counts[i]), tuple(int(v) for v in lut[i, :3]))
+            for i in np.flatnonzero(counts)
+            if lut[i, 3] > 128
+        ]
+
+    def get_palette_lut(self) -> np.ndarray:
+        """Get the lookup table of the current pxls palette (see `make_palette_lut()`),
+        the result is cached until the palette changes"""
+        version, lut = self._palette_lut
+        if version != self.palette_version:
             palette = [f"#{c['value']}" for c in self.get_palette(restricted=True)]
-        for color in palette:
-            rgb = ImageColor.getcolor(color, "RGBA")
-            colors_list.append(rgb)
-        colors_dict = dict(enumerate(colors_list))
-        colors_dict[255] = (0, 0, 0, 0)
+            lut = self.make_palette_lut(palette)
+            lut.setflags(write=False)
+            self._palette_lut = (self.palette_version, lut)
+        return lut
 
-        img = np.stack(np.vectorize(colors_dict.get)(array), axis=-1)
-        return img.astype(np.uint8)
+    @staticmethod
+    def make_palette_lut(palette) -> np.ndarray:
+        """Make a (256, 4) RGBA lookup table from a palette (list of hex colors or
+        array of RGBA colors), the index 255 is transparent"""
+        if isinstance(palette, np.ndarray):
+            colors = np.asarray(palette, dtype=np.uint8)[:, :4]
+        else:
+            colors = np.array(
+                [ImageColor.getcolor(color, "RGBA") for color in palette], dtype=np.uint8
+            )
+        lut = np.zeros((256, 4), dtype=np.uint8)
+        lut[: min(len(colors), 256)] = colors[:256]
+        lut[255] = (0, 0, 0, 0)
+        return lut
+
+    def get_palettized_board(self):
+        """Get the current board as a RGBA array, the result is cached until
+        the board or the palette change"""
+        cached_version, array = self._palettized_board
+        # read the version before palettizing: the board can be updated by the
+        # websocket while this runs in an executor, and the result must not be
+        # cached under a version with pixels it doesn't have
+        version = self.board_version
+        if cached_version != version:
+            array = self.palettize_array(self.board_array)
+            self._palettized_board = (version, array)
+        return array
 
     async def fetch_board(self):
         "fetch the board with a get request"
@@ -202,7 +287,18 @@ class PxlsStatsManager:
         board_array = np.asarray(list(board_bytes), dtype=np.uint8).reshape(
             self.board_info["height"], self.board_info["width"]
         )
+        # keep track of the pixels that changed since the last board
+        old_board = self.board_array
+        if old_board is not None and old_board.shape == board_array.shape:
+            changes = np.flatnonzero(old_board != board_array)
+            if len(self.board_changes) + len(changes) <= MAX_BOARD_CHANGES:
+                self.board_changes.extend(changes.tolist())
+            else:
+                self.board_changes = []
+        else:
+            self.board_changes = []
         self.board_array = board_array
+        self.board_version += 1
         return board_array
 
     async def fetch_virginmap(self):
@@ -241,16 +337,16 @@ class PxlsStatsManager:
 
     async def get_placable_board(self):
         """fetch the board as an index array and use the placemap as a mask"""
-        canvas_array = self.board_array
-        placemap_array = self.placemap_array
-        placeable_board = canvas_array.copy()
-        placeable_board[placemap_array != 0] = 255
-        placeable_board[placemap_array == 0] = canvas_array[placemap_array == 0]
-
-        return placeable_board
+        # np.where gives a new array so the callers can edit it in place
+        return np.where(self.placemap_array != 0, np.uint8(255), self.board_array)
 
     def update_board_pixel(self, x, y, color):
         self.board_array[y, x] = color
+        self.board_version += 1
+        if len(self.board_changes) >= MAX_BOARD_CHANGES:
+            self.board_changes = []
+        else:
+            self.board_changes.append(y * self.board_array.shape[1] + x)
 
     def update_virginmap_pixel(self, x, y, color):
         self.virginmap_array[y, x] = 0
@@ -262,7 +358,8 @@ class PxlsStatsManager:
         return await get_content(url, content_type, cookies=cookies)
 
     def get_cd(self, online_count: int, multiplier: float = None):
-        """Get the cooldown for a given amount of online users"""
+        """Get the cooldown for a given amount of online users,
+        `online_count` can also be a numpy array to get all the cooldowns at once"""
         try:
             # Try to get the cooldown info from the board info
             cd_info = self.board_info["cooldownInfo"]
@@ -284,8 +381,12 @@ class PxlsStatsManager:
         if multiplier is None:
             multiplier = _multiplier
 
+        if isinstance(online_count, np.ndarray):
+            sqrt = np.sqrt
+        else:
+            sqrt = math.sqrt
         cooldown = (
-            steepness * math.sqrt(online_count + user_offset) + global_offset
+            steepness * sqrt(online_count + user_offset) + global_offset
         ) * multiplier
         return cooldown
 
@@ -294,3 +395,36 @@ class PxlsStatsManager:
             return self.board_info["cooldownInfo"]["activityCooldown"]["multiplier"]
         except Exception:
             return 1.0
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def count_canvas_pixels(virginmap: np.ndarray, placemap: np.ndarray):
+    """Count the placeable and non-virgin pixels of the canvas in a single pass
+    over the flattened virginmap and placemap.
+
+    Return `(total_placeable, total_non_virgin)`"""
+    total_placeable = 0
+    total_non_virgin = 0
+    for i in prange(placemap.shape[0]):
+        if placemap[i] != 255:
+            total_placeable += 1
+            if placemap[i] == 0 and virginmap[i] == 0:
+                total_non_virgin += 1
+    return total_placeable, total_non_virgin
+
+
+@jit(nopython=True, parallel=True, cache=True)
+def make_virginmap_indexes(virginmap: np.ndarray, placemap: np.ndarray) -> np.ndarray:
+    """Map the virginmap to palette indexes in a single pass: 0 for the
+    non-virgin pixels, 1 for the virgin ones and 255 for the unplaceable ones"""
+    height, width = virginmap.shape
+    res = np.empty((height, width), dtype=np.uint8)
+    for y in prange(height):
+        for x in range(width):
+            if placemap[y, x] != 0:
+                res[y, x] = 255
+            elif virginmap[y, x] == 255:
+                res[y, x] = 1
+            else:
+                res[y, x] = virginmap[y, x]
+    return res
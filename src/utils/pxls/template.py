@@ -1,11 +1,10 @@
 # code base by Nanineye#2417
 
+import functools
 import os
 
 import numpy as np
-from numba import jit
-from numba.core import types
-from numba.typed import Dict
+from numba import jit, prange
 from PIL import Image
 
 from utils.image.ciede2000 import ciede2000, rgb2lab
@@ -23,21 +22,21 @@ class InvalidStyleException(Exception):
 
 def parse_style_image(style_image: Image.Image):
     try:
-        img_array = np.array(style_image.convert("RGBA"))
+        if style_image.mode != "RGBA":
+            style_image = style_image.convert("RGBA")
+        img_array = np.asarray(style_image)
         alpha = img_array[:, :, 3]
         symbols_per_line = 16
         style_size = int(style_image.width / symbols_per_line)
-        res = np.zeros((symbols_per_line * symbols_per_line, style_size, style_size))
-        color_idx = 0
-        for i in range(symbols_per_line):
-            for j in range(symbols_per_line):
-                x0 = i * style_size
-                y0 = j * style_size
-                x1 = x0 + style_size
-                y1 = y0 + style_size
-                res[color_idx] = alpha[x0:x1, y0:y1]
-                color_idx += 1
-        return res, style_size
+        # split the alpha channel in 16x16 symbols of style_size x style_size
+        # (the symbol index is the palette index, line by line)
+        grid_size = symbols_per_line * style_size
+        res = alpha[:grid_size, :grid_size].reshape(
+            symbols_per_line, style_size, symbols_per_line, style_size
+        )
+        res = res.transpose(0, 2, 1, 3).reshape(-1, style_size, style_size)
+        # store the style as a contiguous uint8 array so templatize can use it as is
+        return np.ascontiguousarray(res, dtype=np.uint8), style_size
 
     except Exception:
         return None, None
@@ -62,18 +61,20 @@ def get_style_from_name(style_name):
     return style
 
 
-none = {"name": "none", "size": 1, "array": np.array([[[255]]] * 255)}
+none = {"name": "none", "size": 1, "array": np.array([[[255]]] * 255, dtype=np.uint8)}
 
 dotted = {
     "name": "dotted",
     "size": 3,
-    "array": np.array([[[0, 0, 0], [0, 255, 0], [0, 0, 0]]] * 255),
+    "array": np.array([[[0, 0, 0], [0, 255, 0], [0, 0, 0]]] * 255, dtype=np.uint8),
 }
 
 plus = {
     "name": "plus",
     "size": 3,
-    "array": np.array([[[0, 255, 0], [255, 255, 255], [0, 255, 0]]] * 255),
+    "array": np.array(
+        [[[0, 255, 0], [255, 255, 255], [0, 255, 0]]] * 255, dtype=np.uint8
+    ),
 }
 
 bigdotted = {
@@ -89,7 +90,8 @@ bigdotted = {
                 [0, 0, 0, 0, 0],
             ]
         ]
-        * 255
+        * 255,
+        dtype=np.uint8,
     ),
 }
 
@@ -102,6 +104,11 @@ for s in custom_styles:
     except InvalidStyleException as e:
         logger.warning(f"failed to load '{s}' style: {e}")
 
+# the styles don't change after they're loaded so their list is only formatted once
+STYLES_AVAILABLE = "**Available Styles:**\n" + "".join(
+    "\t• {0} ({1}x{1})\n".format(style["name"], style["size"]) for style in STYLES
+)
+
 
 def get_style(style_name: str):
     for style in STYLES:
@@ -111,59 +118,97 @@ def get_style(style_name: str):
 
 
 def get_rgba_palette():
+    return _get_rgba_palette(stats.palette_version)
+
+
+@functools.lru_cache(maxsize=4)
+def _get_rgba_palette(palette_version):
     palette = stats.get_palette()
     palette = np.array([c["value"] for c in palette])
     res = []
     for i in palette:
         c = hex_to_rgb(i, "RGBA")
         res.append(c)
-    return np.array(res)
+    res = np.array(res)
+    # the array is shared between all the callers
+    res.setflags(write=False)
+    return res
 
 
 def stylize(style, stylesize, palette, glow_opacity=0):
-    res = np.zeros((len(palette), stylesize, stylesize, 4))
-    for i in range(len(palette)):
-        cstyle = np.zeros((stylesize, stylesize, 4))
-        glow_value = np.copy(palette[i])
-        glow_value[3] = glow_opacity * 255
-        cstyle[:, :] = glow_value
-        for j in range(stylesize):
-            for k in range(stylesize):
-                if style[i, j, k]:
-                    cstyle[j, k] = palette[i]
-                    # change the alpha channel to the value in the style
-                    cstyle[j, k, 3] = style[i, j, k]
-        res[i] = cstyle
+    palette = np.asarray(palette, dtype=np.float64)
+    style = np.asarray(style)[: len(palette)]
+    res = np.empty((len(palette), stylesize, stylesize, 4))
+    # every pixel of a style has the palette color, the alpha channel is the value
+    # in the style or the glow opacity where the style is empty
+    res[:] = palette[:, None, None, :]
+    res[:, :, :, 3] = np.where(style != 0, style, glow_opacity * 255)
     return res
 
 
-@jit(
-    nopython=True,
-    cache=True,
-    locals={"color_bit": types.uint64, "mapped_color_idx": types.uint8},
-)
-def _fast_reduce(array, palette, dist_func):
-    cache = Dict.empty(key_type=types.uint64, value_type=types.uint8)
-    res = np.empty(array.shape[:2], dtype=np.uint8)
-    width = array.shape[1]
-    for idx in range(array.shape[0] * array.shape[1]):
-        i = idx // width
-        j = idx % width
-        alpha = array[i, j, 3]
-        if alpha > 128:
-            color = array[i, j, :3]
-            color_bit = (color[0] << 16) + (color[1] << 8) + color[2]
-            if color_bit in cache:
-                mapped_color_idx = cache[color_bit]
-            else:
-                mapped_color_idx = dist_func(color, palette)
-                cache[color_bit] = mapped_color_idx
-        else:
-            mapped_color_idx = 255
-        res[i, j] = mapped_color_idx
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _match_colors(colors, palette, dist_func):
+    """Find the index of the nearest palette color for each color in `colors`
+    (shape (n, 3)), the colors are split between the CPU cores and the GIL is
+    released so the event loop isn't blocked while it runs in an executor"""
+    res = np.empty(colors.shape[0], dtype=np.uint8)
+    for i in prange(colors.shape[0]):
+        res[i] = dist_func(colors[i], palette)
     return res
 
 
+@functools.lru_cache(maxsize=16)
+def _get_fast_lut(palette_bytes: bytes):
+    """Make a lookup table of the nearest palette index for each color with 5 bits
+    per channel (shape (32, 32, 32)), `palette_bytes` is the bytes of a RGB uint8
+    palette so the result can be cached.
+
+    Return None if 2 palette colors fall in the same cell: the exact palette
+    colors wouldn't be matched to themselves."""
+    palette = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(-1, 3)
+    palette_cells = palette >> 3
+    if len(np.unique(palette_cells, axis=0)) != len(palette_cells):
+        return None
+
+    # nearest palette color to the center of each cell: the squared differences
+    # are computed once per channel (shape (32, palette_size)) and broadcast
+    # instead of building the whole grid of colors
+    centers = (np.arange(32, dtype=np.int32) << 3) + 4
+    r, g, b = ((centers[:, None] - palette[:, i].astype(np.int32)) ** 2 for i in range(3))
+    gb_distances = g[:, None, :] + b[None, :, :]
+    lut = np.empty((32, 32, 32), dtype=np.uint8)
+    # one red slice at a time so the distances stay small enough for the CPU cache
+    # (32 x 32 x palette_size int32 instead of 32 times that)
+    for i in range(32):
+        lut[i] = np.argmin(gb_distances + r[i], axis=-1)
+
+    # make sure the palette colors are matched with themselves
+    lut[palette_cells[:, 0], palette_cells[:, 1], palette_cells[:, 2]] = np.arange(
+        len(palette)
+    )
+    return lut
+
+
+@functools.lru_cache(maxsize=16)
+def _get_lab_palette(palette_bytes: bytes):
+    """Convert a palette to LAB for the CIEDE2000 matching, `palette_bytes` is
+    the bytes of a RGB uint8 palette so the result can be cached."""
+    palette = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(-1, 3)
+    lab_palette = np.asarray([rgb2lab(color) for color in palette])
+    # the array is shared between all the callers
+    lab_palette.setflags(write=False)
+    return lab_palette
+
+
+@functools.lru_cache(maxsize=4)
+def _get_accurate_lut(palette_bytes: bytes):
+    """Get the table of the CIEDE2000 matches already found for a palette, indexed
+    by the packed RGB value of a color (see `reduce()`), 255 means the color wasn't
+    matched yet. The table is shared and filled as new colors are matched so the
+    slow matching is only done once per color."""
+    return np.full(1 << 24, 255, dtype=np.uint8)
+
+
 def reduce(array: np.array, palette: np.array, matching="fast") -> np.array:
     """Convert an image array of RGBA colors to an array of palette index
     matching the nearest color in the given palette
@@ -173,7 +218,7 @@ def reduce(array: np.array, palette: np.array, matching="fast") -> np.array:
     array: a numpy array of RGBA colors (shape (h, w, 4))
     palette: a numpy array (shape (h, w, 1))
     matching: the algorithm to use to match the colors
-    (fast = Euclidean distance, accurate = CIEDE2000)
+    (fast = Euclidean distance with 5 bits per channel, accurate = CIEDE2000)
     """
     matchings = ["fast", "accurate"]
     msg = f"Unkown matching '{matching}', choose from: {', '.join(matchings)}"
@@ -185,14 +230,51 @@ def reduce(array: np.array, palette: np.array, matching="fast") -> np.array:
 
     # Get rid of the alpha component
     palette = palette[:, :3]
+    palette_bytes = np.ascontiguousarray(palette).tobytes()
 
     if matching == "fast":
+        lut = _get_fast_lut(palette_bytes)
+        if lut is not None:
+            # index the flattened table with the 5 high bits of each channel taken
+            # from the pixels viewed as little-endian uint32 (0xAABBGGRR)
+            packed = np.ascontiguousarray(array).view("<u4")[:, :, 0]
+            lut_idx = (
+                ((packed & 0xF8) << 7) | ((packed >> 6) & 0x3E0) | ((packed >> 19) & 0x1F)
+            )
+            res = lut.ravel().take(lut_idx)
+            res[array[:, :, 3] <= 128] = 255
+            return res
         dist_func = nearest_color_idx_euclidean
+        matches_lut = None
     else:
         dist_func = nearest_color_idx_ciede2000
-        palette = np.asarray([rgb2lab(color) for color in palette])
-
-    res = _fast_reduce(array, palette, dist_func)
+        palette = _get_lab_palette(palette_bytes)
+        matches_lut = _get_accurate_lut(palette_bytes)
+
+    # match each unique visible color only once
+    visible_mask = array[:, :, 3] > 128
+    # view each RGBA pixel as a little-endian uint32 and drop the alpha byte
+    # to pack the RGB values without converting every channel
+    packed = np.ascontiguousarray(array).view("<u4")[:, :, 0][visible_mask]
+    packed &= np.uint32(0xFFFFFF)
+    unique_colors, inverse = np.unique(packed, return_inverse=True)
+    unique_rgb = np.empty((unique_colors.shape[0], 3), dtype=np.uint8)
+    unique_rgb[:, 0] = unique_colors
+    unique_rgb[:, 1] = unique_colors >> 8
+    unique_rgb[:, 2] = unique_colors >> 16
+
+    if matches_lut is None:
+        unique_idx = _match_colors(unique_rgb, palette, dist_func)
+    else:
+        # only match the colors that weren't matched by a previous call
+        unique_idx = matches_lut[unique_colors]
+        missing = unique_idx == 255
+        if np.any(missing):
+            unique_idx[missing] = _match_colors(unique_rgb[missing], palette, dist_func)
+            matches_lut[unique_colors[missing]] = unique_idx[missing]
+
+    res = np.full(array.shape[:2], 255, dtype=np.uint8)
+    res[visible_mask] = unique_idx[inverse]
     return res
 
 
@@ -229,21 +311,21 @@ def nearest_color_idx_euclidean(color, palette) -> int:
     palette: a rgb ndarray of uint8 of shape (palette_size,3)
 
     """
-    distances = np.sum((palette - color) ** 2, axis=1)
-    return np.argmin(distances)
-
-
-@jit(nopython=True, cache=True)
-def fast_templatize(n, m, st, red, style_size):
-    res = np.zeros((style_size * n, style_size * m, 4), dtype=np.uint8)
-    for i in range(n):
-        for j in range(m):
-            if red[i, j] != 255:  # non-alpha values
-                res[
-                    style_size * i : style_size * i + style_size,
-                    style_size * j : style_size * j + style_size,
-                ] = st[red[i][j]]
-    return res
+    # compare the channels one by one to avoid allocating arrays for each color
+    r = np.int32(color[0])
+    g = np.int32(color[1])
+    b = np.int32(color[2])
+    min_distance = np.iinfo(np.int32).max
+    nearest_color_idx = 0
+    for i in range(palette.shape[0]):
+        dr = np.int32(palette[i, 0]) - r
+        dg = np.int32(palette[i, 1]) - g
+        db = np.int32(palette[i, 2]) - b
+        distance = dr * dr + dg * dg + db * db
+        if distance < min_distance:
+            min_distance = distance
+            nearest_color_idx = i
+    return nearest_color_idx
 
 
 def templatize(
@@ -251,7 +333,7 @@ def templatize(
 ) -> np.ndarray:
     style_array = style["array"]
     style_size = style["size"]
-    image_array = np.array(image)
+    image_array = np.asarray(image)
 
     n = image_array.shape[0]
     m = image_array.shape[1]
@@ -260,5 +342,15 @@ def templatize(
         palette = get_rgba_palette()
 
     st = stylize(style_array, style_size, palette, glow_opacity)
-    res = fast_templatize(n, m, st, image_array, style_size)
+    # the index 255 (transparent) and the unused indexes stay empty
+    stamps = np.zeros((256, style_size, style_size, 4), dtype=np.uint8)
+    nb_colors = min(len(st), 255)
+    stamps[:nb_colors] = st[:nb_colors]
+
+    # fill the result one row of the styles at a time: view the result as
+    # (n, style_size, m, style_size, 4) and gather the style rows for all the pixels
+    res = np.empty((style_size * n, style_size * m, 4), dtype=np.uint8)
+    res_view = res.reshape(n, style_size, m, style_size, 4)
+    for i in range(style_size):
+        res_view[:, i] = stamps[:, i][image_array]
     return res
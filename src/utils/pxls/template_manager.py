@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import copy
+import functools
 import os
 import re
 import sqlite3
@@ -9,13 +10,14 @@ import time
 import urllib.parse
 from datetime import datetime, timedelta
 from io import BytesIO
+from types import MappingProxyType
 from typing import Iterable, Optional
-from urllib.parse import parse_qs, urlparse
+from urllib.parse import unquote_plus, urlparse
 
 import disnake
 import numpy as np
 from dotenv import load_dotenv
-from numba import jit
+from numba import jit, prange
 from PIL import Image
 
 from utils.font.font_manager import PixelText
@@ -30,6 +32,10 @@ from utils.utils import get_content, in_executor
 logger = get_logger("template_manager")
 tracker_logger = get_logger("template_tracker", file="templates.log", in_console=False)
 
+MAX_DOWNLOADS = 10  # number of simultaneous template downloads
+TEMPLATE_NAME_REGEX = re.compile(r"^[A-Za-z0-9_-]*$")
+RESERVED_TEMPLATE_NAMES = frozenset(["@combo", "combo", "global"])
+
 
 class Template:
     def __init__(
@@ -56,24 +62,42 @@ class Template:
         self.id = None
 
         # template image and array
-        self.palettized_array: np.ndarray = reduce(
-            image_array, get_rgba_palette()
+        # (C-contiguous uint8 so the masks and comparisons work on a single block)
+        self.palettized_array: np.ndarray = np.ascontiguousarray(
+            reduce(image_array, get_rgba_palette()), dtype=np.uint8
         )  # array of palette indexes
 
         # template size and dimensions
         self.width = self.palettized_array.shape[1]
         self.height = self.palettized_array.shape[0]
-        self.total_size = int(np.sum(self.palettized_array != 255))
+        self.total_size = int(np.count_nonzero(self.palettized_array != 255))
         self.placeable_mask = self.make_placeable_mask()
-        self.total_placeable = int(np.sum(self.placeable_mask))
+        self.total_placeable = int(np.count_nonzero(self.placeable_mask))
 
         # progress (init with self.update_progress())
         self.placed_mask = None
         self.current_progress = None
+        # id of the template that made the placed mask, to reuse it
+        self._placed_mask_owner = None
+        # state used to update the progress incrementally as (template id,
+        # board changes list, number of changes used, palettized array, placeable mask)
+        self._progress_state = None
+
+        # (palette version, palettized array, RGBA array) cached by get_array()
+        self._rgba_array = (None, None, None)
 
     def get_array(self) -> np.ndarray:
-        """Return the template image as an array of RGB colors"""
-        return stats.palettize_array(self.palettized_array)
+        """Return the template image as a read-only array of RGBA colors,
+        the result is cached until the palette or the template array changes"""
+        version, palettized_array, rgba_array = self._rgba_array
+        if (
+            version != stats.palette_version
+            or palettized_array is not self.palettized_array
+        ):
+            rgba_array = stats.palettize_array(self.palettized_array)
+            rgba_array.setflags(write=False)
+            self._rgba_array = (stats.palette_version, self.palettized_array, rgba_array)
+        return rgba_array
 
     def make_placeable_mask(self) -> np.ndarray:
         """Make a mask of the template shape where the placeable pixels are True."""
@@ -82,43 +106,114 @@ class Template:
         # create a mask with all the non-transparent pixels on the template image (True = non-transparent)
         placeable_mask = self.palettized_array != 255
         # exclude pixels outside of the placemap
-        placeable_mask[cropped_placemap == 255] = False
+        placeable_mask &= cropped_placemap != 255
         return placeable_mask
 
-    def make_placed_mask(self, board_array=None) -> np.ndarray:
-        """Make a mask of the template shape where the correct pixels are True."""
+    def make_placed_mask(self, board_array=None, out=None) -> np.ndarray:
+        """Make a mask of the template shape where the correct pixels are True.
+        If `out` is given, the mask is written in it instead of a new array."""
         # get the current board cropped to the template size
         if board_array is None:
             board_array = stats.board_array
         cropped_board = self.crop_array_to_template(board_array)
         # create a mask with the pixels of the template matching the board
-        placed_mask = self.palettized_array == cropped_board
+        placed_mask = np.equal(self.palettized_array, cropped_board, out=out)
         # exclude the pixels outside of the placemap
-        placed_mask[~self.placeable_mask] = False
+        placed_mask &= self.placeable_mask
         return placed_mask
 
     def update_progress(self, board_array=None) -> int:
-        """Update the mask with the correct pixels and the number of correct pixels."""
-        self.placed_mask = self.make_placed_mask(board_array)
-        self.current_progress = int(np.sum(self.placed_mask))
+        """Update the mask with the correct pixels and the number of correct pixels.
+
+        When using the current board, only the pixels changed since the last
+        update are checked if nothing else changed."""
+        if board_array is not None:
+            self._progress_state = None
+            return self._compute_progress(board_array)
+
+        board_changes = stats.board_changes
+        state = self._progress_state
+        if (
+            state is not None
+            and state[0] == id(self)
+            and state[1] is board_changes
+            and state[3] is self.palettized_array
+            and state[4] is self.placeable_mask
+            and len(board_changes) - state[2] <= self.placed_mask.size // 4
+        ):
+            self._update_changed_pixels(board_changes[state[2] :])
+        else:
+            self._compute_progress()
+        self._progress_state = (
+            id(self),
+            board_changes,
+            len(board_changes),
+            self.palettized_array,
+            self.placeable_mask,
+        )
+        return self.current_progress
+
+    def _compute_progress(self, board_array=None) -> int:
+        """Compute the placed mask and progress on the whole template, the previous
+        mask is overwritten if it was made by this template (copies share it)"""
+        out = None
+        if (
+            self._placed_mask_owner == id(self)
+            and self.placed_mask.shape == self.palettized_array.shape
+        ):
+            out = self.placed_mask
+        self.placed_mask = self.make_placed_mask(board_array, out)
+        self._placed_mask_owner = id(self)
+        self.current_progress = int(np.count_nonzero(self.placed_mask))
         return self.current_progress
 
+    def _update_changed_pixels(self, changes: list[int]):
+        """Update the placed mask and progress for the given board changes
+        (flat indexes of the changed pixels in the board)"""
+        if not changes:
+            return
+        board_array = stats.board_array
+        y, x = np.divmod(np.unique(np.array(changes)), board_array.shape[1])
+        # keep the pixels inside the template
+        inside = (y >= self.oy) & (y < self.oy + self.height)
+        inside &= (x >= self.ox) & (x < self.ox + self.width)
+        board_colors = board_array[y[inside], x[inside]]
+        y = y[inside] - self.oy
+        x = x[inside] - self.ox
+
+        was_placed = self.placed_mask[y, x]
+        is_placed = self.palettized_array[y, x] == board_colors
+        is_placed &= self.placeable_mask[y, x]
+        self.placed_mask[y, x] = is_placed
+        self.current_progress += int(np.count_nonzero(is_placed)) - int(
+            np.count_nonzero(was_placed)
+        )
+
     def crop_array_to_template(self, array: np.ndarray) -> np.ndarray:
         """Crop an array to fit in the template bounds
         (used to crop the board and placemap to the template size for previews and such)
+        The result is a view of the array when the template is inside its bounds,
+        it must be copied before being modified.
         :param array: a palettized numpy array of indexes"""
+        if (
+            self.oy >= 0
+            and self.ox >= 0
+            and self.oy + self.height <= array.shape[0]
+            and self.ox + self.width <= array.shape[1]
+        ):
+            return array[self.oy : self.oy + self.height, self.ox : self.ox + self.width]
+
         # deal with out of bounds coords:
-        # to do that we copy the part of the array matching the template area
-        # and we paste it on a new array with the template size at the correct coords
+        # to do that we paste the part of the array matching the template area
+        # on a new array with the template size at the correct coords
         y0 = min(max(0, self.oy), array.shape[0])
         y1 = max(0, min(array.shape[0], self.oy + self.height))
         x0 = min(max(0, self.ox), array.shape[1])
         x1 = max(0, min(array.shape[1], self.ox + self.width))
-        _cropped_array = array[y0:y1, x0:x1].copy()
         cropped_array = np.full_like(self.palettized_array, 255)
-        cropped_array[
-            y0 - self.oy : y1 - self.oy, x0 - self.ox : x1 - self.ox
-        ] = _cropped_array
+        cropped_array[y0 - self.oy : y1 - self.oy, x0 - self.ox : x1 - self.ox] = array[
+            y0:y1, x0:x1
+        ]
 
         return cropped_array
 
@@ -134,15 +229,22 @@ class Template:
         """
         if self.placed_mask is None:
             self.update_progress(board_array)
-        progress_array = np.zeros((self.height, self.width, 4), dtype=np.uint8)
-        # correct pixels = green
-        progress_array[self.placed_mask] = [0, 255, 0, 255 * opacity]
-        # incorrect pixels = red
-        progress_array[~self.placed_mask] = [255, 0, 0, 255 * opacity]
-        # not placeable = blue
-        progress_array[~self.placeable_mask] = [0, 0, 255, 255]
-        # outside of the template = transparent
-        progress_array[self.palettized_array == 255] = [0, 0, 0, 0]
+        # color of each pixel class
+        class_colors = np.array(
+            [
+                # outside of the template = transparent
+                [0, 0, 0, 0],
+                # not placeable = blue
+                [0, 0, 255, 255],
+                # incorrect pixels = red
+                [255, 0, 0, 255 * opacity],
+                # correct pixels = green
+                [0, 255, 0, 255 * opacity],
+            ]
+        ).astype(np.uint8)
+        progress_array = make_progress_array(
+            self.palettized_array, self.placeable_mask, self.placed_mask, class_colors
+        )
         progress_image = Image.fromarray(progress_array)
 
         # layer the board under the progress image if the progress opacity is less than 1
@@ -151,7 +253,7 @@ class Template:
                 board_array = stats.board_array
             cropped_board = self.crop_array_to_template(board_array)
             # remove the pixels outside of the template visible pixels area
-            cropped_board[self.palettized_array == 255] = 255
+            cropped_board = np.where(self.palettized_array == 255, 255, cropped_board)
             board_image = Image.fromarray(stats.palettize_array(cropped_board))
             res_image = Image.new("RGBA", board_image.size)
             res_image = Image.alpha_composite(res_image, board_image)
@@ -173,16 +275,20 @@ class Template:
         opacity: the opacity of the canvas."""
         if array is None:
             array = self.get_array()
-        board = await stats.get_placable_board()
-        cropped_board = self.crop_array_to_template(board)
+        # crop the board and placemap before masking the unplaceable pixels
+        # so only the template area is processed instead of the whole canvas
+        cropped_board = self.crop_array_to_template(stats.board_array)
+        visible_mask = self.crop_array_to_template(stats.placemap_array) == 0
         if crop_to_template:
-            cropped_board[~self.placeable_mask] = 255
+            visible_mask &= self.placeable_mask
+        cropped_board = np.where(visible_mask, cropped_board, np.uint8(255))
         cropped_board_array = stats.palettize_array(cropped_board)
         return highlight_image(array, cropped_board_array, opacity, (0, 0, 0, 255))
 
     def get_wrong_pixels_mask(self):
         """Get a mask with all the wrong pixels"""
-        return np.logical_and(~self.placed_mask, self.placeable_mask)
+        # placeable and not placed, in a single pass over the masks
+        return self.placeable_mask > self.placed_mask
 
     async def get_progress_at(self, dt: datetime):
         """Get the template at a given datetime
@@ -196,14 +302,17 @@ class Template:
     def get_virgin_abuse(self):
         """Return the number of correct pixels that are also virgin pixels"""
         template_virginmap = self.crop_array_to_template(stats.virginmap_array)
-        abuse_mask = np.logical_and(template_virginmap, self.placed_mask)
-        return int(np.sum(abuse_mask))
+        # virgin pixels, then keep the correct ones in place
+        abuse_mask = template_virginmap != 0
+        abuse_mask &= self.placed_mask
+        return int(np.count_nonzero(abuse_mask))
 
     async def get_eta(self, as_string=True):
         now = round_minutes_down(datetime.utcnow())
         td = timedelta(days=7)
-        old_datetime, old_progress = await self.get_progress_at(now - td)
-        now_datetime, now_progress = await self.get_progress_at(now)
+        (old_datetime, old_progress), (now_datetime, now_progress) = await asyncio.gather(
+            self.get_progress_at(now - td), self.get_progress_at(now)
+        )
         if old_progress is None or now_progress is None:
             return None, None
 
@@ -292,38 +401,36 @@ class Template:
 
         chunk_size: the size of the chunks we're dividing the template into"""
 
-        def to_chunks(arr, nrows, ncols):
-            """divide arr into chunks of size nrows x ncols"""
-            h, w = arr.shape
-            assert h % nrows == 0, f"{h} rows is not evenly divisible by {nrows}"
-            assert w % ncols == 0, f"{w} cols is not evenly divisible by {ncols}"
-            return (
-                arr.reshape(h // nrows, nrows, -1, ncols)
-                .swapaxes(1, 2)
-                .reshape(-1, nrows, ncols)
-            )
+        # no need to look at the chunks if the template is complete
+        if (
+            self.current_progress is not None
+            and self.current_progress == self.total_placeable
+        ):
+            return (None, None)
 
         # mask with all the pixels to place
-        togo_mask = np.logical_and(~self.placed_mask, self.placeable_mask)
-
-        # pad the mask to be dividable by the block size
-        right_pad = chunk_size - togo_mask.shape[1] % chunk_size
-        bottom_pad = chunk_size - togo_mask.shape[0] % chunk_size
-        togo_mask = np.pad(togo_mask, [(0, bottom_pad), (0, right_pad)])
-
-        # convert to a list of chunk size sub-arrays
-        chunked_mask = to_chunks(togo_mask, chunk_size, chunk_size)
+        togo_mask = self.get_wrong_pixels_mask()
+
+        # count the pixels to place in each chunk: sum the rows of each chunk
+        # then the columns (the chunks on the edges can be smaller)
+        chunk_rows = np.add.reduceat(
+            togo_mask,
+            np.arange(0, togo_mask.shape[0], chunk_size),
+            axis=0,
+            dtype=np.int32,
+        )
+        chunk_sums = np.add.reduceat(
+            chunk_rows, np.arange(0, togo_mask.shape[1], chunk_size), axis=1
+        )
 
         # find the chunk with the most pixels to place
-        max_index = fast_max_chunk(chunked_mask)
-        if max_index == -1:
+        max_index = int(chunk_sums.argmax())
+        if chunk_sums.flat[max_index] == 0:
             # there are no chunk with pixels to placed
             return (None, None)
 
         # convert the chunk index to coords in the the template
-        highest_chunk_coords = np.unravel_index(
-            max_index, [c // chunk_size for c in togo_mask.shape]
-        )
+        highest_chunk_coords = divmod(max_index, chunk_sums.shape[1])
 
         # get the coordinate at the center of the block
         coords_in_template = [
@@ -391,18 +498,29 @@ class Combo(Template):
         self.hidden = False
         self.name = name
 
-        self.palettized_array: np.ndarray = palettized_array
+        # copy the array if it's a view with strides (e.g. cropped by layer())
+        self.palettized_array: np.ndarray = np.ascontiguousarray(
+            palettized_array, dtype=np.uint8
+        )
 
         # template size and dimensions
         self.width = self.palettized_array.shape[1]
         self.height = self.palettized_array.shape[0]
-        self.total_size = int(np.sum(self.palettized_array != 255))
+        self.total_size = int(np.count_nonzero(self.palettized_array != 255))
         self.placeable_mask = None
         self.total_placeable = None
 
         # progress (init with self.update_progress())
         self.placed_mask = None
         self.current_progress = None
+        # id of the template that made the placed mask, to reuse it
+        self._placed_mask_owner = None
+        # state used to update the progress incrementally as (template id,
+        # board changes list, number of changes used, palettized array, placeable mask)
+        self._progress_state = None
+
+        # (palette version, palettized array, RGBA array) cached by get_array()
+        self._rgba_array = (None, None, None)
 
 
 class TemplateManager:
@@ -410,6 +528,8 @@ class TemplateManager:
 
     def __init__(self) -> None:
         self.list: list[Template] = []
+        # the templates in self.list indexed by name (see `_get_name_key()`)
+        self._templates_by_name: dict[tuple, Template] = {}
         self.progress_admins = []
         self.combo: Combo = None
         self.is_loading = False
@@ -438,10 +558,13 @@ class TemplateManager:
             # check the public templates with the same image
             list_to_search = self.get_all_public_templates()
         for t in list_to_search:
+            # compare the coords and size first so the arrays are only compared
+            # for the templates at the same place
             if (
-                template.palettized_array.shape == t.palettized_array.shape
-                and (template.palettized_array == t.palettized_array).all()
-                and (template.oy == t.oy and template.ox == t.ox)
+                template.ox == t.ox
+                and template.oy == t.oy
+                and template.palettized_array.shape == t.palettized_array.shape
+                and np.array_equal(template.palettized_array, t.palettized_array)
             ):
                 return t
         return None
@@ -453,13 +576,13 @@ class TemplateManager:
         - cannot be "@combo" or "combo"
 
         Raise ValueError if invalid name or return the name"""
-        if not re.match(r"^[A-Za-z0-9_-]*$", name):
+        if not TEMPLATE_NAME_REGEX.match(name):
             raise ValueError(
                 "The template name can only contain letters, numbers, hyphens (`-`) and underscores (`_`)."
             )
         if len(name) < 2 or len(name) > 30:
             raise ValueError("The template name must be between 2 and 30 characters.")
-        if name.lower() in ["@combo", "combo", "global"]:
+        if name.lower() in RESERVED_TEMPLATE_NAMES:
             raise ValueError("This name is reserved for the @combo template.")
         return name
 
@@ -517,7 +640,7 @@ class TemplateManager:
         id = await db_templates.create_template(template)
         template.id = id
         # save in list
-        self.list.append(template)
+        self.add_template(template)
         # update the @combo
         self.update_combo()
         # log
@@ -528,15 +651,36 @@ class TemplateManager:
         Return None if not found."""
         if name.lower() in ["@combo", "combo", "global"] and self.combo is not None:
             return self.combo
-        for temp in self.list:
-            if temp.name.lower() == name.lower():
-                if hidden:
-                    if temp.hidden and temp.owner_id == owner_id:
-                        return temp
-                else:
-                    if not temp.hidden:
-                        return temp
-        return None
+        return self._templates_by_name.get(self._get_name_key(name, owner_id, hidden))
+
+    @staticmethod
+    def _get_name_key(name: str, owner_id, hidden) -> tuple:
+        """Get the key of a template name in the index: the public templates
+        have a unique name and the hidden ones have a unique name per owner"""
+        if hidden:
+            return (name.lower(), owner_id, True)
+        return (name.lower(), None, False)
+
+    def add_template(self, template: Template, index=None):
+        """Add a template to the tracked list (at the end or at the given index)"""
+        if index is None:
+            self.list.append(template)
+        else:
+            self.list.insert(index, template)
+        key = self._get_name_key(template.name, template.owner_id, template.hidden)
+        self._templates_by_name.setdefault(key, template)
+
+    def remove_template(self, template: Template):
+        """Remove a template from the tracked list (without deleting it from the database)"""
+        self.list.remove(template)
+        key = self._get_name_key(template.name, template.owner_id, template.hidden)
+        if self._templates_by_name.get(key) is template:
+            del self._templates_by_name[key]
+            # index the next template with the same name if there is one
+            for temp in self.list:
+                if self._get_name_key(temp.name, temp.owner_id, temp.hidden) == key:
+                    self._templates_by_name[key] = temp
+                    break
 
     async def delete_template(self, name, command_user, hidden):
         command_user_id = command_user.id
@@ -552,7 +696,7 @@ class TemplateManager:
             raise ValueError("You cannot delete the combo.")
 
         await db_templates.delete_template(temp)
-        self.list.remove(temp)
+        self.remove_template(temp)
         self.update_combo()
         tracker_logger.info(
             f"Template deleted: '{temp.name}' by {command_user} ({command_user.id})"
@@ -626,7 +770,8 @@ class TemplateManager:
             new_temp.hidden = old_temp.hidden
             new_temp.id = old_temp.id
         else:
-            new_temp = copy.deepcopy(old_temp)
+            # the arrays are never modified in place, so the copy can share them
+            new_temp = copy.copy(old_temp)
 
         if new_name:
             # check valid name (this raises a ValueError if the name isn't valid)
@@ -657,8 +802,8 @@ class TemplateManager:
         if not temp_id:
             raise ValueError("There was an error while updating the template.")
         old_temp_index = self.list.index(old_temp)
-        self.list.remove(old_temp)
-        self.list.insert(old_temp_index, new_temp)
+        self.remove_template(old_temp)
+        self.add_template(new_temp, old_temp_index)
         self.update_combo()
         tracker_logger.info(
             "Template updated: '{}' by {} ({}):{}{}{}".format(
@@ -690,42 +835,69 @@ class TemplateManager:
         initial_len = len(self.list)
         has_combo = False
         if stats.placemap_array is not None:
-            for db_temp in db_list:
-                name = db_temp["name"]
-                owner_id = db_temp["owner_id"]
-                hidden = db_temp["hidden"]
-                url = db_temp["url"]
-                id = db_temp["id"]
-                if name != "@combo":
-                    if self.get_template(name, owner_id, hidden):
-                        if not update:
-                            logger.debug(
-                                f"Template {name} not loaded: Duplicate template."
-                            )
-                        continue
+            sem = asyncio.Semaphore(MAX_DOWNLOADS)
+
+            async def download_template(db_temp):
+                async with sem:
                     try:
-                        temp = await asyncio.wait_for(
-                            get_template_from_url(url), timeout=5.0
-                        )
-                        temp.name = name
-                        temp.owner_id = int(owner_id)
-                        temp.hidden = bool(hidden)
-                        temp.canvas_code = canvas_code
-                        temp.id = id
-                        self.list.append(temp)
-                        logger.debug(
-                            f"template {temp.name} loaded ({len(self.list)}/{len(db_list)-1})"
+                        return await asyncio.wait_for(
+                            get_template_from_url(db_temp["url"], canvas_code),
+                            timeout=5.0,
                         )
                     except asyncio.TimeoutError:
                         if not update:
                             logger.warn(
-                                "Failed to load template {}: TimeoutError".format(name)
+                                "Failed to load template {}: TimeoutError".format(
+                                    db_temp["name"]
+                                )
                             )
                     except Exception as e:
                         if not update:
-                            logger.warn("Failed to load template {}: {}".format(name, e))
-                else:
+                            logger.warn(
+                                "Failed to load template {}: {}".format(
+                                    db_temp["name"], e
+                                )
+                            )
+                    return None
+
+            # download all the templates that aren't loaded yet at the same time
+            to_download = []
+            for db_temp in db_list:
+                if db_temp["name"] == "@combo":
                     has_combo = True
+                elif self.get_template(
+                    db_temp["name"], db_temp["owner_id"], db_temp["hidden"]
+                ):
+                    if not update:
+                        logger.debug(
+                            f"Template {db_temp['name']} not loaded: Duplicate template."
+                        )
+                else:
+                    to_download.append(db_temp)
+            downloaded = await asyncio.gather(
+                *[download_template(db_temp) for db_temp in to_download]
+            )
+
+            # add them in the database order, skipping the duplicates
+            for db_temp, temp in zip(to_download, downloaded):
+                name = db_temp["name"]
+                owner_id = db_temp["owner_id"]
+                hidden = db_temp["hidden"]
+                if self.get_template(name, owner_id, hidden):
+                    if not update:
+                        logger.debug(f"Template {name} not loaded: Duplicate template.")
+                    continue
+                if temp is None:
+                    continue
+                temp.name = name
+                temp.owner_id = int(owner_id)
+                temp.hidden = bool(hidden)
+                temp.canvas_code = canvas_code
+                temp.id = db_temp["id"]
+                self.add_template(temp)
+                logger.debug(
+                    f"template {temp.name} loaded ({len(self.list)}/{len(db_list)-1})"
+                )
         end = time.time()
         nb_templates = len(db_list) - (1 if has_combo else 0)
         if not update or (update and len(self.list) != initial_len):
@@ -770,30 +942,46 @@ class TemplateManager:
         self.combo.palettized_array[stats.placemap_array == 255] = 255
         # update the placeable mask
         self.combo.placeable_mask = self.combo.make_placeable_mask()
-        self.combo.total_placeable = int(np.sum(self.combo.placeable_mask))
+        self.combo.total_placeable = int(np.count_nonzero(self.combo.placeable_mask))
         return self.combo
 
     async def get_templates(self, templates_uris: list[str]) -> list[Template]:
         """Turn a list of strings (either template names or URLs) to a list of template.
 
         Raises ValueError if a template is not found or cannot be parsed"""
-        templates = []
-        templates_to_remove = []
-        for i, template_name in enumerate(templates_uris):
-            to_remove = template_name.startswith("!")
-            if to_remove:
-                template_name = template_name[1:]
+        sem = asyncio.Semaphore(MAX_DOWNLOADS)
+
+        async def resolve_template(i, template_name):
             if parse_template(template_name) is not None:
                 try:
-                    template = await get_template_from_url(template_name)
+                    async with sem:
+                        return await get_template_from_url(template_name, canvas_code)
                 except ValueError:
                     raise ValueError(
                         f"Please use a valid template link for template {i}."
                     )
-            else:
-                template = self.get_template(template_name, None, False)
-                if template is None:
-                    raise ValueError(f"No template named `{template_name}` found.")
+            template = self.get_template(template_name, None, False)
+            if template is None:
+                raise ValueError(f"No template named `{template_name}` found.")
+            return template
+
+        # download the templates at the same time
+        canvas_code = await stats.get_canvas_code()
+        to_remove_list = [name.startswith("!") for name in templates_uris]
+        results = await asyncio.gather(
+            *[
+                resolve_template(i, name[1:] if to_remove else name)
+                for i, (name, to_remove) in enumerate(zip(templates_uris, to_remove_list))
+            ],
+            return_exceptions=True,
+        )
+
+        templates = []
+        templates_to_remove = []
+        for template, to_remove in zip(results, to_remove_list):
+            # raise the error of the first template that couldn't be found
+            if isinstance(template, BaseException):
+                raise template
             if to_remove:
                 templates_to_remove.append(template)
             else:
@@ -808,29 +996,6 @@ class TemplateManager:
         return templates
 
 
-@jit(nopython=True, cache=True)
-def fast_detemplatize(array, true_height, true_width, block_size):
-
-    result = np.zeros((true_height, true_width, 4), dtype=np.uint8)
-
-    for y in range(true_height):
-        for x in range(true_width):
-            for j in range(block_size):
-                for i in range(block_size):
-                    py = y * block_size + j
-                    px = x * block_size + i
-                    alpha = array[py, px, 3]
-                    if alpha > 128:
-                        result[y, x] = array[py, px]
-                        result[y, x, 3] = 255
-                        break
-                # to break out of the double loop
-                else:
-                    continue
-                break
-    return result
-
-
 def detemplatize(img_raw: np.ndarray, true_width: int) -> np.ndarray:
     """
     Convert a styled template image back to its original version.
@@ -839,29 +1004,58 @@ def detemplatize(img_raw: np.ndarray, true_width: int) -> np.ndarray:
         return img_raw
     block_size = img_raw.shape[1] // true_width
     true_height = img_raw.shape[0] // block_size
-    img_array = np.array(img_raw, dtype=np.uint8)
-    img = fast_detemplatize(img_array, true_height, true_width, block_size)
-    return img
+    img_array = np.asarray(img_raw, dtype=np.uint8)
+
+    # view the image as (true_height, block_size, true_width, block_size, 4) blocks
+    blocks = img_array[: true_height * block_size, : true_width * block_size].reshape(
+        true_height, block_size, true_width, block_size, 4
+    )
+    # use the top-left pixel of each block when it is visible
+    result = blocks[:, 0, :, 0].copy()
+    visible = result[:, :, 3] > 128
+    result[visible, 3] = 255
+
+    # for the other blocks, use the first visible pixel of the block (if any)
+    ys, xs = np.nonzero(~visible)
+    if len(ys) > 0:
+        # only gather the alpha channel of these blocks to find the pixel to use,
+        # then gather the color of that pixel
+        other_visible = blocks[ys, :, xs, :, 3].reshape(len(ys), -1) > 128
+        first_visible = other_visible.argmax(axis=1)
+        by, bx = np.divmod(first_visible, block_size)
+        colors = blocks[ys, by, xs, bx]
+        colors[:, 3] = 255
+        colors[~other_visible[np.arange(len(ys)), first_visible]] = 0
+        result[ys, xs] = colors
+    return result
 
 
+@functools.lru_cache(maxsize=1024)
 def parse_template(template_url: str):
-    """Get the parameters from a template URL, return `None` if the template is invalid"""
-    for e in ["http", "://", "template", "tw", "ox", "oy"]:
-        if e not in template_url:
-            return None
+    """Get the parameters from a template URL, return `None` if the template is invalid
+
+    The result is cached for each URL and returned as a read-only mapping"""
+    if any(e not in template_url for e in ("http", "://", "template", "tw", "ox", "oy")):
+        return None
     parsed_template = urlparse(template_url)
-    params = parse_qs(parsed_template.fragment)
+    # split the fragment like `parse_qs()` does but only keep the first value
+    # of each parameter instead of making lists
+    params = {}
+    for field in parsed_template.fragment.split("&"):
+        key, _, value = field.partition("=")
+        if value:
+            params.setdefault(unquote_plus(key), unquote_plus(value))
     for e in ["template", "tw", "ox", "oy"]:
         if e not in params.keys():
             return None
-    # because 'parse_qs()' puts the parameters in arrays
-    for k in params.keys():
-        params[k] = params[k][0]
-    return params
+    return MappingProxyType(params)
+
 
+async def get_template_from_url(template_url: str, canvas_code=None) -> Template:
+    """Make a Template object from a template URL
 
-async def get_template_from_url(template_url: str) -> Template:
-    """Make a Template object from a template URL"""
+    canvas_code: the canvas code of the template (default: the current canvas code),
+    can be given to avoid getting it for each template when loading many templates"""
     params = parse_template(template_url)
 
     if params is None:
@@ -874,14 +1068,16 @@ async def get_template_from_url(template_url: str) -> Template:
         image_bytes = await get_content(image_url, "image")
     except Exception:
         raise ValueError("Couldn't download the template image.")
-    canvas_code = await stats.get_canvas_code()
+    if canvas_code is None:
+        canvas_code = await stats.get_canvas_code()
 
     @in_executor()
     def _get_template():
         template_image = Image.open(BytesIO(image_bytes))
         if template_image.mode != "RGBA":
             template_image = template_image.convert("RGBA")
-        template_array = np.array(template_image)
+        # detemplatize and reduce don't modify the array, no need to copy it
+        template_array = np.asarray(template_image)
 
         detemp_array = detemplatize(template_array, true_width)
         ox = int(params["ox"])
@@ -906,12 +1102,20 @@ def crop_array_to_shape(array1, height, width, oy, ox):
     y1 = max(0, min(array1.shape[0], oy + height))
     x0 = min(max(0, ox), array1.shape[1])
     x1 = max(0, min(array1.shape[1], ox + width))
-    _cropped_array = array1[y0:y1, x0:x1].copy()
-    cropped_array = np.full((height, width), 255)
-    cropped_array[y0 - oy : y1 - oy, x0 - ox : x1 - ox] = _cropped_array
+    # paste the part of the array inside the shape directly on the result
+    cropped_array = np.full((height, width), 255, dtype=array1.dtype)
+    cropped_array[y0 - oy : y1 - oy, x0 - ox : x1 - ox] = array1[y0:y1, x0:x1]
     return cropped_array
 
 
+def palettize_array_to_shape(array, height, width, oy, ox):
+    """Palettize an index array and place it at (ox, oy) on a transparent
+    RGBA array of the given shape, only the array area is palettized"""
+    res = np.zeros((height, width, 4), dtype=np.uint8)
+    res[oy : oy + array.shape[0], ox : ox + array.shape[1]] = stats.palettize_array(array)
+    return res
+
+
 @in_executor()
 def make_before_after_gif(
     old_temp: Template, new_temp: Template, extra_padding=5, with_text=True
@@ -955,40 +1159,38 @@ def make_before_after_gif(
     max_width = max_x1 - min_x0
 
     # crop the current canvas to the result images size
-    background_before = crop_array_to_shape(
+    background = crop_array_to_shape(
         stats.board_array, max_height, max_width, min_y0, min_x0
     )
-    background_before = stats.palettize_array(background_before)
-    background_after = background_before.copy()
-
-    # add padding to images so they can have the exact same size
-    old_y0_offset = old_temp_y0 - min_y0
-    old_x0_offset = old_temp_x0 - min_x0
-    old_y1_offset = max_y1 - old_temp_y1
-    old_x1_offset = max_x1 - old_temp_x1
-    old_temp_padding = [
-        (old_y0_offset, old_y1_offset),
-        (old_x0_offset, old_x1_offset),
-    ]
-    array_before = np.pad(
-        old_temp.palettized_array, old_temp_padding, constant_values=255
+    background = stats.palettize_array(background)
+
+    # place the template images on transparent images so they have the exact same size
+    array_before = palettize_array_to_shape(
+        old_temp.palettized_array,
+        max_height,
+        max_width,
+        old_temp_y0 - min_y0,
+        old_temp_x0 - min_x0,
+    )
+    array_after = palettize_array_to_shape(
+        new_temp.palettized_array,
+        max_height,
+        max_width,
+        new_temp_y0 - min_y0,
+        new_temp_x0 - min_x0,
     )
-    array_before = stats.palettize_array(array_before)
-
-    new_y0_offset = new_temp_y0 - min_y0
-    new_x0_offset = new_temp_x0 - min_x0
-    new_y1_offset = max_y1 - new_temp_y1
-    new_x1_offset = max_x1 - new_temp_x1
-    new_temp_padding = [
-        (new_y0_offset, new_y1_offset),
-        (new_x0_offset, new_x1_offset),
-    ]
-    array_after = np.pad(new_temp.palettized_array, new_temp_padding, constant_values=255)
-    array_after = stats.palettize_array(array_after)
-
-    # paste the template images on the canvas and darken the canvas
-    img_before = highlight_image(array_before, background_before, 0.3, (0, 0, 0, 255))
-    img_after = highlight_image(array_after, background_after, 0.3, (0, 0, 0, 255))
+
+    # darken the canvas once (by highlighting a transparent image over it)
+    # and paste the template images on copies of it
+    darkened_background = highlight_image(
+        np.zeros_like(background), background, 0.3, (0, 0, 0, 255)
+    )
+    img_before = darkened_background.copy()
+    img_before_top = Image.fromarray(array_before)
+    img_before.paste(img_before_top, (0, 0), img_before_top)
+    img_after = darkened_background
+    img_after_top = Image.fromarray(array_after)
+    img_after.paste(img_after_top, (0, 0), img_after_top)
 
     # add the text
     if with_text:
@@ -1005,17 +1207,39 @@ def make_before_after_gif(
     return diff_gif
 
 
+@jit(nopython=True, parallel=True, cache=True)
+def make_progress_array(
+    palettized_array: np.ndarray,
+    placeable_mask: np.ndarray,
+    placed_mask: np.ndarray,
+    class_colors: np.ndarray,
+) -> np.ndarray:
+    """Color each pixel of a template in a single pass with the color of its class
+    in `class_colors`: outside of the template, not placeable, incorrect or correct"""
+    height, width = palettized_array.shape
+    res = np.empty((height, width, 4), dtype=np.uint8)
+    for y in prange(height):
+        for x in range(width):
+            if palettized_array[y, x] == 255:
+                pixel_class = 0
+            elif not placeable_mask[y, x]:
+                pixel_class = 1
+            elif placed_mask[y, x]:
+                pixel_class = 3
+            else:
+                pixel_class = 2
+            res[y, x] = class_colors[pixel_class]
+    return res
+
+
 @jit(nopython=True, cache=True)
-def fast_max_chunk(chunked_mask):
-    """find the index of the chunk with the most pixels to place in a chunk list"""
-    max_index = -1
-    chunk_pixels = 0
-    for i, chunk in enumerate(chunked_mask):
-        sum = np.sum(chunk)
-        if sum > chunk_pixels:
-            chunk_pixels = sum
-            max_index = i
-    return max_index
+def paste_visible_pixels(background: np.ndarray, array: np.ndarray, ox: int, oy: int):
+    """Paste the non-transparent pixels of an index array on the background
+    at (ox, oy) in place, without making a mask of the visible pixels"""
+    for y in range(array.shape[0]):
+        for x in range(array.shape[1]):
+            if array[y, x] != 255:
+                background[oy + y, ox + x] = array[y, x]
 
 
 def layer(
@@ -1039,14 +1263,13 @@ def layer(
         except ValueError:  # Template outside canvas
             continue
         # Don't update transparent pixels
-        mask = arr != 255
-        background[oy : oy + arr.shape[0], ox : ox + arr.shape[1]][mask] = arr[mask]
+        paste_visible_pixels(background, arr, ox, oy)
         min_x = min(ox, min_x)
         min_y = min(oy, min_y)
         max_x = max(ox + template.width, max_x)
         max_y = max(oy + template.height, max_y)
     if crop_to_placemap:
-        background[placemap != 0] = 255
+        np.copyto(background, np.uint8(255), where=placemap != 0)
     if crop_to_template:
         return min_x, min_y, background[min_y:max_y, min_x:max_x]
     return 0, 0, background
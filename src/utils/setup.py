@@ -9,10 +9,7 @@ from database.db_servers_manager import DbServersManager
 from database.db_stats_manager import DbStatsManager
 from database.db_template_manager import DbTemplateManager
 from database.db_user_manager import DbUserManager
-from utils.image.imgur import Imgur
-from utils.image.s3compat import S3Compat
 from utils.pxls.pxls_stats_manager import PxlsStatsManager
-from utils.pxls.websocket_client import WebsocketClient
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 load_dotenv()
@@ -41,9 +38,8 @@ db_users = DbUserManager(db_conn)
 db_templates = DbTemplateManager(db_conn)
 db_canvas = DbCanvasManager(db_conn)
 
-# websocket
+# websocket (the client is created the first time it's used, see __getattr__)
 ws_uri = os.getenv("PXLS_WEBSOCKET")
-ws_client = WebsocketClient(ws_uri, stats)
 
 # guild IDs
 test_server_id = os.getenv("TEST_SERVER_ID")
@@ -66,10 +62,6 @@ IMGUR_CLIENT_SECRET = os.getenv("IMGUR_CLIENT_SECRET")
 IMGUR_ACCESS_TOKEN = os.getenv("IMGUR_ACCESS_TOKEN")
 IMGUR_REFRESH_TOKEN = os.getenv("IMGUR_REFRESH_TOKEN")
 
-imgur_app = Imgur(
-    IMGUR_CLIENT_ID, IMGUR_CLIENT_SECRET, IMGUR_REFRESH_TOKEN, IMGUR_ACCESS_TOKEN
-)
-
 # S3 Compatible Storage
 S3_COMPAT_ENDPOINT = os.getenv("S3_COMPAT_ENDPOINT")
 S3_COMPAT_ACCESS_KEY = os.getenv("S3_COMPAT_ACCESS_KEY")
@@ -77,10 +69,32 @@ S3_COMPAT_SECRET_KEY = os.getenv("S3_COMPAT_SECRET_KEY")
 S3_COMPAT_BUCKET_NAME = os.getenv("S3_COMPAT_BUCKET_NAME")
 S3_COMPAT_ACCESS_URL = os.getenv("S3_COMPAT_ACCESS_URL")
 
-s3compat_app = S3Compat(
-    S3_COMPAT_ACCESS_KEY,
-    S3_COMPAT_SECRET_KEY,
-    S3_COMPAT_ENDPOINT,
-    S3_COMPAT_BUCKET_NAME,
-    S3_COMPAT_ACCESS_URL
-)
+
+def __getattr__(name):
+    """Create the websocket, imgur and S3 clients the first time they're imported,
+    so the scripts using this module don't load their dependencies (boto3, websockets)"""
+    if name == "ws_client":
+        from utils.pxls.websocket_client import WebsocketClient
+
+        value = WebsocketClient(ws_uri, stats)
+    elif name == "imgur_app":
+        from utils.image.imgur import Imgur
+
+        value = Imgur(
+            IMGUR_CLIENT_ID, IMGUR_CLIENT_SECRET, IMGUR_REFRESH_TOKEN, IMGUR_ACCESS_TOKEN
+        )
+    elif name == "s3compat_app":
+        from utils.image.s3compat import S3Compat
+
+        value = S3Compat(
+            S3_COMPAT_ACCESS_KEY,
+            S3_COMPAT_SECRET_KEY,
+            S3_COMPAT_ENDPOINT,
+            S3_COMPAT_BUCKET_NAME,
+            S3_COMPAT_ACCESS_URL,
+        )
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    # cache the client so it's only created once
+    globals()[name] = value
+    return value
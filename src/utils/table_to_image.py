@@ -84,37 +84,29 @@ def make_table_array(data, alignments, colors, bg_colors, theme: Theme, font):
             else:
                 align = alignments[j]
             if align == "right":
-                padding = np.zeros(
-                    (element.shape[0], diff_with_longest, 4), dtype=np.uint8
-                )
-                padding[:, :] = bg_color
-                element = np.append(padding, element, axis=1)
-            if align == "left":
-                padding = np.zeros(
-                    (element.shape[0], diff_with_longest, 4), dtype=np.uint8
-                )
-                padding[:, :] = bg_color
-                element = np.append(element, padding, axis=1)
-            if align == "center":
-                half, rest = divmod(diff_with_longest, 2)
-                padding_left = np.zeros((element.shape[0], half, 4), dtype=np.uint8)
-                padding_left[:, :] = bg_color
-                padding_right = np.zeros(
-                    (element.shape[0], half + rest, 4), dtype=np.uint8
-                )
-                padding_right[:, :] = bg_color
-
-                element = np.append(padding_left, element, axis=1)
-                element = np.append(element, padding_right, axis=1)
-
-            # add the margin inside the cells
-            hmargin = np.zeros((element.shape[0], horizontal_margin, 4), dtype=np.uint8)
-            hmargin[:, :] = bg_color
-            element = np.concatenate((hmargin, element, hmargin), axis=1)
-
-            vmargin = np.zeros((vertical_margin, element.shape[1], 4), dtype=np.uint8)
-            vmargin[:, :] = bg_color
-            element = np.concatenate((vmargin, element, vmargin), axis=0)
+                padding_left = diff_with_longest
+            elif align == "center":
+                padding_left = diff_with_longest // 2
+            else:
+                padding_left = 0
+
+            # write the element in a cell filled with its background color
+            # to add the alignment padding and the margin inside the cell
+            cell = np.empty(
+                (
+                    element.shape[0] + 2 * vertical_margin,
+                    longest_element + 2 * horizontal_margin,
+                    4,
+                ),
+                dtype=np.uint8,
+            )
+            cell[:, :] = bg_color
+            x0 = horizontal_margin + padding_left
+            cell[
+                vertical_margin : vertical_margin + element.shape[0],
+                x0 : x0 + element.shape[1],
+            ] = element
+            element = cell
 
             # add the grid line around the element
             element = add_border(element, line_width, line_color)
@@ -87,17 +87,14 @@ def check_data_url(url):
     return data_bytes
 
 
+PROGRESS_BAR_FULL = "​█"
+PROGRESS_BAR_EMPTY = " "
+
+
 def make_progress_bar(percentage, nb_char=20):
-    full = "​█"
-    empty = " "
-    res_bar = ""
     bar_idx = int((percentage / 100) * nb_char)
-    for i in range(nb_char):
-        if i < bar_idx:
-            res_bar += full
-        else:
-            res_bar += empty
-    return res_bar
+    nb_full = max(0, min(bar_idx, nb_char))
+    return PROGRESS_BAR_FULL * nb_full + PROGRESS_BAR_EMPTY * (nb_char - nb_full)
 
 
 def ordinal(n):